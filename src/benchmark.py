@@ -0,0 +1,137 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from generate_database import build_tables, write_database
+from utils.aggregates import compute_category_means, compute_survey_stats
+from utils.config import override_setting
+from utils.database import fetch_data, fetch_joined_data, get_engine
+from utils.indexes import build_filter_index
+from utils.processing import group_comments, group_responses, join_responses
+from utils.rankings import compute_rankings
+from utils.trends import compute_trends
+
+# Mede o tempo e o pico de memória de cada etapa do processamento em bancos sintéticos de vários tamanhos.
+# Deve ser executado a partir da raiz do repositório, por exemplo:
+#   python src/benchmark.py --sizes 10000 100000 1000000 --output data/store/benchmark.csv
+
+
+def measure(stage, func, *args, memory=True):
+    # Executa a etapa medindo o tempo. O pico de memória é medido numa segunda execução,
+    # porque o tracemalloc deixa o código bem mais lento e distorceria o tempo
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return result, {'stage': stage, 'seconds': round(elapsed, 3), 'peak_mb': None if peak is None else round(peak, 1)}
+
+
+def rows(df):
+    return len(df) if isinstance(df, pd.DataFrame) else None
+
+
+def run_size(size, directory, memory=True, seed=0):
+    # O tamanho é a quantidade de respostas. Os comentários, professores e disciplinas crescem junto
+    tables = build_tables(teachers=max(50, size // 5_000), courses=max(50, size // 3_000),
+                          responses=size, comments=size // 2, seed=seed)
+    path = Path(directory) / f'benchmark_{size}.db'
+    write_database(tables, path)
+
+    # Aponta o sistema para o banco gerado, trocando o engine do pool
+    override_setting('DATABASE_URL', f'sqlite:///{path}')
+    get_engine.clear()
+
+    results = []
+
+    legacy, result = measure('fetch_data', fetch_data, memory=memory)
+    result.update(rows_in=None, rows_out=rows(legacy[1]))
+    results.append(result)
+
+    responses_joined, result = measure('join_responses', join_responses, *legacy[:8], memory=memory)
+    result.update(rows_in=rows(legacy[1]), rows_out=rows(responses_joined))
+    results.append(result)
+
+    (teachers, responses_joined, comments), result = measure('fetch_joined_data', fetch_joined_data, memory=memory)
+    result.update(rows_in=None, rows_out=rows(responses_joined))
+    results.append(result)
+
+    (responses_grouped, nps), result = measure('group_responses', group_responses, responses_joined, memory=memory)
+    result.update(rows_in=rows(responses_joined), rows_out=rows(responses_grouped))
+    results.append(result)
+
+    comments_grouped, result = measure('group_comments', group_comments, comments,
+                                       responses_grouped['schoolCourseCode'].unique(), memory=memory)
+    result.update(rows_in=rows(comments), rows_out=rows(comments_grouped))
+    results.append(result)
+
+    category_means, result = measure('compute_category_means', compute_category_means, responses_grouped,
+                                     memory=memory)
+    result.update(rows_in=rows(responses_grouped), rows_out=rows(category_means))
+    results.append(result)
+
+    survey_stats, result = measure('compute_survey_stats', compute_survey_stats, responses_grouped, memory=memory)
+    result.update(rows_in=rows(responses_grouped), rows_out=rows(survey_stats))
+    results.append(result)
+
+    trends, result = measure('compute_trends', compute_trends, category_means, memory=memory)
+    result.update(rows_in=rows(category_means), rows_out=rows(trends))
+    results.append(result)
+
+    rankings, result = measure('compute_rankings', compute_rankings, responses_grouped, nps, memory=memory)
+    result.update(rows_in=rows(responses_grouped), rows_out=rows(rankings))
+    results.append(result)
+
+    filter_index, result = measure('build_filter_index', build_filter_index, teachers, responses_grouped, nps,
+                                   comments_grouped, memory=memory)
+    result.update(rows_in=rows(responses_grouped), rows_out=None)
+    results.append(result)
+
+    get_engine().dispose()
+    for result in results:
+        result['size'] = size
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Mede o tempo e a memória de cada etapa do processamento em bancos sintéticos.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='quantidades de respostas dos bancos gerados')
+    parser.add_argument('--no-memory', action='store_true', help='não mede o pico de memória (mais rápido)')
+    parser.add_argument('--seed', type=int, default=0, help='semente dos números aleatórios')
+    parser.add_argument('--label', default='', help='identificação da execução, por exemplo o commit')
+    parser.add_argument('--output', help='arquivo CSV onde os resultados são acrescentados, para comparar execuções')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            results.extend(run_size(size, directory, memory=not args.no_memory, seed=args.seed))
+
+    report = pd.DataFrame(results)[['size', 'stage', 'rows_in', 'rows_out', 'seconds', 'peak_mb']]
+    report[['rows_in', 'rows_out']] = report[['rows_in', 'rows_out']].astype('Int64')
+    print(report.to_string(index=False))
+
+    if args.output:
+        report.insert(0, 'label', args.label)
+        report.insert(0, 'run_at', datetime.now().isoformat(timespec='seconds'))
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        report.to_csv(output, mode='a', header=not output.exists(), index=False)
+
+
+if __name__ == '__main__':
+    main()
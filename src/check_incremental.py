@@ -0,0 +1,85 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from generate_database import build_tables, write_database
+from utils import incremental
+from utils.config import override_setting
+from utils.database import fetch_joined_data, get_engine
+from utils.pipeline import build_frames
+
+# Confere se o modo "incremental" chega nos mesmos dados que a carga completa depois de uma mudança no
+# cadastro dos professores: um professor desativado e outro com nome e departamento novos.
+# Deve ser executado a partir da raiz do repositório, por exemplo:
+#   python src/check_incremental.py --size 100000
+
+
+def _normalize(df):
+    # Mesma ordem de linhas e colunas e sem categorias, para comparar só os valores
+    df = df.astype({column: object for column in df.select_dtypes('category').columns})
+    return df[sorted(df.columns)].sort_values(sorted(df.columns)).reset_index(drop=True)
+
+
+def compare(name, incremental_df, full_df):
+    try:
+        pd.testing.assert_frame_equal(_normalize(incremental_df), _normalize(full_df), check_dtype=False)
+    except AssertionError as error:
+        print(f"{name}: diferente ({len(incremental_df)} linhas no incremental, {len(full_df)} na carga completa)")
+        print(f"  {str(error).splitlines()[0]}")
+        return False
+
+    print(f"{name}: igual ({len(full_df)} linhas)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compara o modo incremental com a carga completa depois de mudanças no cadastro dos professores.')
+    parser.add_argument('--size', type=int, default=100_000, help='quantidade de respostas do banco gerado')
+    parser.add_argument('--seed', type=int, default=0, help='semente dos números aleatórios')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'check_incremental.db'
+        write_database(build_tables(teachers=max(50, args.size // 5_000), courses=max(50, args.size // 3_000),
+                                    responses=args.size, comments=args.size // 2, seed=args.seed), path)
+
+        # Aponta o sistema para o banco gerado e guarda os dados locais do modo incremental na pasta temporária
+        override_setting('DATABASE_URL', f'sqlite:///{path}')
+        get_engine.clear()
+        incremental.FACTS_DIR = Path(directory) / 'facts'
+
+        # Primeira carga, que fica salva localmente
+        incremental.refresh_facts()
+
+        # Desativa o professor com mais respostas e muda o nome e o departamento do segundo
+        with sqlite3.connect(path) as conn:
+            deactivated, renamed = [row[0] for row in conn.execute(
+                'SELECT personAssesseeId FROM tb_course_evaluation_responseLikertFact '
+                'GROUP BY personAssesseeId ORDER BY COUNT(*) DESC LIMIT 2')]
+            conn.execute("UPDATE tb_course_evaluation_personDim SET personStatus = 'Inactive' WHERE personId = ?",
+                         (deactivated,))
+            conn.execute("UPDATE tb_course_evaluation_personDim SET fullName = 'NOME ATUALIZADO', "
+                         "departmentName = 'Departamento Novo' WHERE personId = ?", (renamed,))
+        conn.close()
+
+        incremental_data = incremental.refresh_facts()
+        full_data = fetch_joined_data()
+        get_engine().dispose()
+
+    equal = all([compare(name, incremental_df, full_df) for name, incremental_df, full_df in zip(
+        ['teachers', 'responses_joined', 'comments'], incremental_data, full_data)])
+
+    incremental_frames, full_frames = build_frames(*incremental_data), build_frames(*full_data)
+    equal = all([compare(name, incremental_frames[name], full_frames[name])
+                 for name in ('responses_grouped', 'nps', 'category_means', 'rankings')]) and equal
+
+    sys.exit(0 if equal else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from openai import OpenAI
+
+from utils.config import get_setting, parse_years
+from utils.lesson_plans import convert_lesson_plans
+from utils.pipeline import build_frames, fetch_raw_data
+from utils.snapshot import save_snapshot
+from utils.summary_batch import precompute_summaries
+
+# Processa os dados fora do Streamlit e salva um novo snapshot, com todas as agregações prontas.
+# Deve ser executado a partir da raiz do repositório, por exemplo pelo cron:
+#   0 * * * * cd /caminho/do/repositorio && python src/etl.py
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Busca os dados no banco, calcula as agregações das páginas e salva um novo snapshot.')
+    parser.add_argument('--mode', choices=['joined', 'incremental', 'legacy'],
+                        default=get_setting('QUERY_MODE', 'joined'),
+                        help='modo de busca dos dados no banco')
+    parser.add_argument('--years', nargs='*', default=get_setting('LOAD_YEARS'),
+                        help='anos que devem ser carregados (padrão: todo o histórico)')
+    parser.add_argument('--skip-summaries', action='store_true',
+                        help='não gera os resumos dos comentários novos')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    raw_data = fetch_raw_data(args.mode, parse_years(args.years))
+    fetched = time.perf_counter()
+    frames = build_frames(*raw_data)
+    built = time.perf_counter()
+    manifest = save_snapshot(frames)
+
+    # Também deixa o catálogo de planos de aula pronto em parquet
+    convert_lesson_plans()
+
+    print(f"Busca no banco: {fetched - started:.1f}s")
+    print(f"Processamento: {built - fetched:.1f}s")
+    print(f"Snapshot salvo em {manifest['created_at']}:")
+    for name, rows in manifest['rows'].items():
+        print(f"  {name}: {rows} linhas")
+
+    # Gera os resumos dos professores e turmas com comentários novos
+    api_key = get_setting('OPENAI_API_KEY')
+    if api_key and not args.skip_summaries:
+        summaries_started = time.perf_counter()
+        stats = precompute_summaries(
+            OpenAI(api_key=api_key), frames['comments_grouped'])
+        print(f"Resumos: {stats['generated']} gerados, {stats['cached']} já salvos, "
+              f"{stats['failed']} com erro, {stats['skipped']} acima do SUMMARY_CACHE_MAX_ENTRIES "
+              f"({time.perf_counter() - summaries_started:.1f}s)")
+        for error in stats['errors']:
+            print(f"  {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.processing import COMMENT_QUESTIONS
+
+# Gera um banco SQLite com as mesmas tabelas tb_course_evaluation_* do banco de produção, preenchidas com dados
+# sintéticos, para medir o desempenho do sistema localmente. Deve ser executado a partir da raiz do repositório:
+#   python src/generate_database.py --responses 1000000 --output data/store/synthetic.db
+
+DEPARTMENTS = ['Direito', 'Engenharia', 'Economia', 'Administração', 'Saúde']
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+               'Larissa', 'Marcelo', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vanessa', 'Vinícius']
+LAST_NAMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Costa', 'Rodrigues', 'Almeida', 'Nascimento',
+              'Lima', 'Araújo', 'Fernandes', 'Carvalho', 'Gomes', 'Martins', 'Rocha', 'Ribeiro', 'Barbosa']
+PROGRAMS = ['MBA', 'MPA', 'LLM', 'CEP', 'MPE']
+
+# Perguntas de cada categoria, com a última categoria sendo a do NPS (escala de 0 a 10)
+QUESTIONS = {
+    'Questões relacionadas ao planejamento: / Course Planning and Structure:': [
+        'Apresenta o plano de aula no início da disciplina.',
+        'Esclarece os princípios (a essência) da disciplina.',
+        'Enfatiza os conteúdos comuns com outras disciplinas.',
+    ],
+    'Questões relacionadas à dinâmica: / Classroom Dynamics:': [
+        'Demonstra dominar a matéria.',
+        'Conduz a exposição dos conteúdos e discussões de maneira organizada e clara.',
+        'Estimula a participação dos alunos.',
+    ],
+    'Questões relacionadas à avaliação / Assessment:': [
+        'As avaliações são coerentes com o conteúdo da disciplina.',
+        'Os critérios de avaliação são claros.',
+    ],
+    'Questões relacionadas ao feedback / Feedback:': [
+        'Dá feedback sobre as avaliações em tempo adequado.',
+        'O feedback ajuda a melhorar o desempenho.',
+    ],
+    'Avaliação Geral': [
+        'Você recomendaria este professor para um colega?',
+    ],
+}
+
+# Textos usados nos comentários. Os mais curtos são descartados pelo sistema, como acontece com os reais
+COMMENT_TEXTS = np.array([
+    'ok', '-', 'nada', 'Tudo certo', 'Continuar com os estudos de caso em sala',
+    'Trazer mais exemplos práticos do mercado', 'As aulas são muito bem organizadas',
+    'Dar mais tempo para as discussões em grupo', 'Enviar o material antes das aulas',
+    'Explica muito bem os conceitos mais difíceis', 'Parar de atrasar o início da aula',
+    'Usar menos slides e mais discussões', None,
+], dtype=object)
+
+
+def build_tables(teachers=200, periods=6, courses=300, responses=100_000, comments=50_000, start_year=2022, seed=0,
+                 other_share=0.2):
+    rng = np.random.default_rng(seed)
+
+    # Professores, com alguns inativos ou que não são docentes, que o sistema deve ignorar
+    person_ids = np.arange(1, teachers + 1)
+    first = np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), teachers)]
+    last = np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), teachers)]
+    usernames = np.char.add(np.char.add(np.char.lower(first.astype(str)), '.'), person_ids.astype(str))
+    person_dim = pd.DataFrame({
+        'departmentName': np.array(DEPARTMENTS)[rng.integers(0, len(DEPARTMENTS), teachers)],
+        'personId': person_ids,
+        'fullName': np.char.add(np.char.add(first.astype(str), ' '), last.astype(str)),
+        'lastNameFirst': np.char.add(np.char.add(last.astype(str), ', '), first.astype(str)),
+        'coursevalUserName': usernames,
+        'email': np.char.add(usernames, '@insper.edu.br'),
+        'personStatus': np.where(rng.random(teachers) < 0.9, 'Active', 'Inactive'),
+        'facultyYn': np.where(rng.random(teachers) < 0.95, 'Y', 'N'),
+    })
+
+    # Dois períodos por ano
+    period_ids = np.arange(1, periods + 1)
+    period_dim = pd.DataFrame({
+        'periodId': period_ids,
+        'periodName': [f'{(period - 1) % 2 + 1}º semestre' for period in period_ids],
+        'periodYear': [str(start_year + (period - 1) // 2) for period in period_ids],
+    })
+
+    # Uma pesquisa parcial e uma final da PGLS por período, além de uma pesquisa de outra escola
+    survey_rows = []
+    for period_id, name, year in period_dim.itertuples(index=False):
+        semester = name[0]
+        survey_rows.append((f'PGLS {year}.{semester} Parcial', period_id))
+        survey_rows.append((f'PGLS {year}.{semester} Final', period_id))
+        survey_rows.append((f'GRAD {year}.{semester} Final', period_id))
+    survey_dim = pd.DataFrame({
+        'surveyId': np.arange(1, len(survey_rows) + 1),
+        'surveyName': [name for name, period_id in survey_rows],
+    })
+    survey_period = np.array([period_id for name, period_id in survey_rows])
+
+    # Disciplinas, cada uma oferecida num período para uma turma, com ou sem divisão. Uma parte (other_share)
+    # é da outra escola, avaliada só na pesquisa dela, e deve ser ignorada pelos filtros da PGLS
+    course_ids = np.arange(1, courses + 1)
+    course_period = rng.integers(1, periods + 1, courses)
+    is_other_school = rng.random(courses) < other_share
+    schools = np.where(is_other_school, 'GRAD', 'PGLS')
+    programs = np.array(PROGRAMS)[rng.integers(0, len(PROGRAMS), courses)]
+    class_numbers = rng.integers(1, 30, courses)
+    subdivisions = np.array(['', '_A', '_B'])[rng.integers(0, 3, courses)]
+    school_course_codes = [
+        f'{school}.{period_dim.periodYear.iat[period - 1]}.{program}{number:02d}X{course}{subdivision}'
+        for course, period, program, number, subdivision, school in zip(
+            course_ids, course_period, programs, class_numbers, subdivisions, schools)]
+    course_dim = pd.DataFrame({
+        'courseId': course_ids,
+        'courseName': [f'Disciplina {course}' for course in course_ids],
+        'courseNumber': [f'D{course:05d}' for course in course_ids],
+        'schoolCourseCode': school_course_codes,
+    })
+
+    # Perguntas e escalas de resposta
+    question_rows = [(category, question) for category, questions in QUESTIONS.items() for question in questions]
+    question_dim = pd.DataFrame({
+        'questionId': np.arange(1, len(question_rows) + 1),
+        'question': [question for category, question in question_rows],
+        'questionSubCategory': [category for category, question in question_rows],
+    })
+    is_nps_question = (question_dim['questionSubCategory'] == 'Avaliação Geral').to_numpy()
+    response_set_dim = pd.concat([
+        pd.DataFrame({'responseScale': 'Likert 1-5', 'responseSetId': 1, 'responseValue': np.arange(1, 6)}),
+        pd.DataFrame({'responseScale': 'NPS 0-10', 'responseSetId': 2, 'responseValue': np.arange(0, 11)}),
+    ], ignore_index=True)
+    response_set_dim['responseLegend'] = response_set_dim['responseValue'].astype(str)
+
+    # Cada disciplina tem um ou dois professores, e cada professor é avaliado na pesquisa parcial e na final.
+    # As disciplinas da outra escola usam a pesquisa dela nas duas avaliações
+    offering_course = np.repeat(course_ids, rng.integers(1, 3, courses))
+    offering_teacher = rng.integers(1, teachers + 1, len(offering_course))
+    offering_course = np.repeat(offering_course, 2)
+    offering_teacher = np.repeat(offering_teacher, 2)
+    offering_period = course_period[offering_course - 1]
+    offering_survey = (offering_period - 1) * 3 + np.where(
+        is_other_school[offering_course - 1], 3, np.tile([1, 2], len(offering_course) // 2))
+    offerings = len(offering_course)
+
+    expected = rng.integers(15, 60, offerings)
+    taken = np.minimum(expected, rng.integers(5, 60, offerings))
+    survey_assessment_fact = pd.DataFrame({
+        'surveyAssessmentFactId': np.arange(1, offerings + 1),
+        'totalExpectedSurveys': expected,
+        'totalSurveysTaken': taken,
+        'responseRate': np.round(100 * taken / expected, 2),
+    })
+
+    # Cada aluno responde todas as perguntas de uma avaliação, até chegar na quantidade de respostas pedida
+    questions = len(question_dim)
+    sheets = max(1, responses // questions)
+    sheet_offering = rng.integers(0, offerings, sheets)
+    offering = np.repeat(sheet_offering, questions)
+    question_ids = np.tile(question_dim['questionId'].to_numpy(), sheets)
+    nps = np.tile(is_nps_question, sheets)
+    values = np.where(nps, rng.integers(0, 11, len(offering)), rng.integers(1, 6, len(offering)))
+    response_likert_fact = pd.DataFrame({
+        'responseValue': values,
+        'responseZeroValue': values - 1,
+        'surveyId': offering_survey[offering],
+        'surveyAssessmentFactId': offering + 1,
+        'questionId': question_ids,
+        'responseSetId': np.where(nps, 2, 1),
+        'periodId': offering_period[offering],
+        'courseId': offering_course[offering],
+        'personAssesseeId': offering_teacher[offering],
+    })
+
+    # Comentários das três perguntas usadas pelo sistema e de uma outra pergunta, que deve ser ignorada
+    comment_questions = np.array(list(COMMENT_QUESTIONS) + ['Comentários gerais sobre a disciplina.'])
+    comment_offering = rng.integers(0, offerings, comments)
+    results_comments = pd.DataFrame({
+        'crs_code': np.array(school_course_codes)[offering_course[comment_offering] - 1],
+        'eval_username': usernames[offering_teacher[comment_offering] - 1],
+        'question': comment_questions[rng.integers(0, len(comment_questions), comments)],
+        'survey': survey_dim['surveyName'].to_numpy()[offering_survey[comment_offering] - 1],
+        'response': COMMENT_TEXTS[rng.integers(0, len(COMMENT_TEXTS), comments)],
+    })
+
+    return {
+        'tb_course_evaluation_personDim': person_dim,
+        'tb_course_evaluation_surveyDim': survey_dim,
+        'tb_course_evaluation_surveyAssessmentFact': survey_assessment_fact,
+        'tb_course_evaluation_questionDim': question_dim,
+        'tb_course_evaluation_responseSetDim': response_set_dim,
+        'tb_course_evaluation_periodDim': period_dim,
+        'tb_course_evaluation_courseDim': course_dim,
+        'tb_course_evaluation_responseLikertFact': response_likert_fact,
+        'tb_course_evaluation_results_Comments': results_comments,
+    }
+
+
+def write_database(tables, path):
+    # Recria o banco do zero, com índices nas colunas usadas nos joins, como no banco de produção
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+
+    with sqlite3.connect(path) as conn:
+        for name, df in tables.items():
+            df.to_sql(name, conn, index=False, chunksize=100_000)
+        conn.execute('CREATE INDEX ix_likert_person ON tb_course_evaluation_responseLikertFact (personAssesseeId)')
+        conn.execute('CREATE INDEX ix_likert_period ON tb_course_evaluation_responseLikertFact (periodId)')
+        conn.execute('CREATE INDEX ix_comments_code ON tb_course_evaluation_results_Comments (crs_code)')
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Gera um banco SQLite com dados sintéticos das avaliações de disciplinas.')
+    parser.add_argument('--output', default='data/store/synthetic.db', help='arquivo do banco gerado')
+    parser.add_argument('--teachers', type=int, default=200, help='quantidade de professores')
+    parser.add_argument('--periods', type=int, default=6, help='quantidade de períodos (dois por ano)')
+    parser.add_argument('--courses', type=int, default=300, help='quantidade de disciplinas')
+    parser.add_argument('--responses', type=int, default=100_000, help='quantidade aproximada de respostas')
+    parser.add_argument('--comments', type=int, default=50_000, help='quantidade de comentários')
+    parser.add_argument('--start-year', type=int, default=2022, help='ano do primeiro período')
+    parser.add_argument('--seed', type=int, default=0, help='semente dos números aleatórios')
+    parser.add_argument('--other-share', type=float, default=0.2,
+                        help='fração das disciplinas (e portanto das respostas e comentários) de outra escola')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tables = build_tables(args.teachers, args.periods, args.courses, args.responses, args.comments,
+                          args.start_year, args.seed, args.other_share)
+    write_database(tables, args.output)
+
+    print(f"Banco gerado em {args.output} ({time.perf_counter() - started:.1f}s):")
+    for name, df in tables.items():
+        print(f"  {name}: {len(df)} linhas")
+    print(f"Para usá-lo, configure DATABASE_URL = \"sqlite:///{Path(args.output).resolve()}\"")
+
+
+if __name__ == '__main__':
+    main()
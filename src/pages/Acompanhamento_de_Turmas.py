@@ -1,8 +1,21 @@
 import streamlit as st
 import pandas as pd
-import re
 from openai import OpenAI
-from sqlalchemy import create_engine
+
+from utils.admin import render_admin_panel
+from utils.aggregates import (CATEGORY_LABELS, format_survey_stats,
+                              summarize_category_means)
+from utils.data import load_frames
+from utils.indexes import EMPTY
+from utils.instrumentation import stage
+from utils.lesson_plans import lookup_lesson_plans
+from utils.pagination import comment_list, paginate
+from utils.rankings import format_rankings
+from utils.summaries import SUMMARY_STREAM, stream_summary, summarize_comments
+from utils.trends import TREND_WINDOW, select_trends
+
+# Nome da página nas medições de desempenho
+PAGE = 'turmas'
 
 st.set_page_config(page_title="PGLS | Acompanhamento de Turmas",
                    page_icon="📈", layout='wide')
@@ -10,326 +23,33 @@ st.set_page_config(page_title="PGLS | Acompanhamento de Turmas",
 # Inicializa o client da OpenAI
 client = OpenAI(api_key=st.secrets.OPENAI_API_KEY)
 
-
-def fetch_data():
-    # Conecta ao banco de dados
-    engine = create_engine(st.secrets.DATABASE_URL)
-    conn = engine.connect()
-
-    # Busca todos os campos da tabela de pessoas onde ela está ativa na escola, é um professor e o nome do programa é Not Applicable
-    query = """
-        SELECT departmentName, personId, fullName, lastNameFirst, coursevalUserName, email FROM tb_course_evaluation_personDim
-        WHERE personStatus == 'Active'
-        AND facultyYn == 'Y'
-    """
-
-    # Executa a query e coloca o resultado em um DataFrame
-    teachers = pd.read_sql_query(query, conn)
-
-    # Pega os ids dos professores
-    teachers_ids = teachers['personId'].unique()
-    # Coloca os ids em uma só string separado por vírgulas
-    teachers_ids_str = ', '.join(map(str, teachers_ids))
-
-    # Busca pelas respostas as quais remetem aos professores da PGLS
-    query = f"""
-        SELECT responseValue, responseZeroValue, surveyId, surveyAssessmentFactId, questionId, responseSetId, periodId, courseId, personAssesseeId FROM tb_course_evaluation_responseLikertFact
-        WHERE personAssesseeId IN ({teachers_ids_str})
-    """
-    responses = pd.read_sql_query(query, conn)
-
-    # Pega os ids únicos para buscar na tabela de pesquisas
-    surveys_ids = responses['surveyId'].unique()
-    surveys_ids_str = ', '.join(map(str, surveys_ids))
-    query = f"""
-        SELECT surveyId, surveyName FROM tb_course_evaluation_surveyDim
-        WHERE surveyId in ({surveys_ids_str})
-    """
-    surveys_dim = pd.read_sql_query(query, conn)
-
-    # Pega os ids únicos para buscar na tabela de informações das pesquisas
-    surveyAssessmentFact_ids = responses['surveyAssessmentFactId'].unique()
-    surveyAssessmentFact_ids_str = ', '.join(
-        map(str, surveyAssessmentFact_ids))
-    query = f"""
-        SELECT surveyAssessmentFactId, totalExpectedSurveys, totalSurveysTaken, responseRate FROM tb_course_evaluation_surveyAssessmentFact
-        WHERE surveyAssessmentFactId in ({surveyAssessmentFact_ids_str})
-    """
-    surveyAssessmentFact_dim = pd.read_sql_query(query, conn)
-
-    # Pega os ids únicos para buscar na tabela de perguntas
-    questions_ids = responses['questionId'].sort_values().unique()
-    questions_ids_str = ', '.join(map(str, questions_ids))
-    query = f"""
-        SELECT questionId, question, questionSubCategory FROM tb_course_evaluation_questionDim
-        WHERE questionId in ({questions_ids_str})
-    """
-    question_dim = pd.read_sql_query(query, conn)
-
-    # Pega os ids únicos para buscar na tabela de respostas
-    responseSet_ids = responses['responseSetId'].unique()
-    responseSet_ids_str = ', '.join(map(str, responseSet_ids))
-    query = f"""
-        SELECT responseScale, responseSetId, responseValue, responseLegend FROM tb_course_evaluation_responseSetDim
-        WHERE responseSetId in ({responseSet_ids_str})
-    """
-    response_set_dim = pd.read_sql_query(query, conn)
-
-    # Pega os ids únicos para buscar na tabela de períodos
-    periods_ids = responses['periodId'].unique()
-    periods_ids_str = ', '.join(map(str, periods_ids))
-    query = f"""
-        SELECT periodId, periodName, periodYear FROM tb_course_evaluation_periodDim
-        WHERE periodId in ({periods_ids_str})
-    """
-    period_dim = pd.read_sql_query(query, conn)
-
-    # Pega os ids únicos para buscar na tabela de cursos
-    courses_ids = responses['courseId'].unique()
-    courses_ids_str = ', '.join(map(str, courses_ids))
-    query = f"""
-        SELECT courseId, courseName, courseNumber, schoolCourseCode FROM tb_course_evaluation_courseDim
-        WHERE courseId in ({courses_ids_str})
-    """
-    course_dim = pd.read_sql_query(query, conn)
-
-    # Busca os comentários
-    query = f"""
-        SELECT crs_code, eval_username, question, survey, response FROM tb_course_evaluation_results_Comments
-    """
-    comments = pd.read_sql_query(query, conn)
-
-    # Fecha a conexão com o banco de dados
-    conn.close()
-
-    return teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim, comments
-
-
-def extract_class_and_subdivision(code):
-    # Expressão regular para extrair a turma (letras e números iniciais)
-    match_class = re.match(r'^[A-Za-z]+\d+', code)
-    class_code = match_class.group(0) if match_class else code
-
-    # Expressão regular para extrair a divisão (últimos caracteres após "_", se existir)
-    match_subdivision = re.search(r'_(\w+)$', code)
-    subdivision = match_subdivision.group(1) if match_subdivision else None
-
-    # Retorna a turma com a divisão anexada, se existir
-    return f"{class_code}_{subdivision}" if subdivision else class_code
-
-
-def group_responses(teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim):
-    # Junta as respostas com os professores
-    responses_joined_with_teachers = pd.merge(
-        responses, teachers, left_on='personAssesseeId', right_on='personId')
-    responses_joined_with_teachers.drop(
-        columns=['personId', 'personAssesseeId'], inplace=True)
-
-    # Junta as respostas com os nomes das pesquisas
-    responses_joined_with_surveys = pd.merge(
-        responses_joined_with_teachers, surveys_dim, on='surveyId')
-    responses_joined_with_surveys.drop(columns=['surveyId'], inplace=True)
-
-    # Junta as respostas com os dados das pesquisas
-    responses_joined_with_surveys = pd.merge(
-        responses_joined_with_surveys, surveyAssessmentFact_dim, on='surveyAssessmentFactId')
-    responses_joined_with_surveys.drop(
-        columns=['surveyAssessmentFactId'], inplace=True)
-
-    # Junta as perguntas às respostas
-    responses_joined_with_questions = pd.merge(
-        responses_joined_with_surveys, question_dim, on='questionId')
-    responses_joined_with_questions.drop(columns=['questionId'], inplace=True)
-
-    responses_joined_with_questions = pd.merge(
-        responses_joined_with_questions, response_set_dim, on=['responseSetId', 'responseValue'])
-    responses_joined_with_questions.drop(
-        columns=['responseSetId'], inplace=True)
-
-    # Junta os períodos às respostas
-    responses_joined_with_periods = pd.merge(
-        responses_joined_with_questions, period_dim, on='periodId')
-    responses_joined_with_periods.drop(columns=['periodId'], inplace=True)
-
-    # Junta os cursos às respostas
-    responses_joined_with_courses = pd.merge(
-        responses_joined_with_periods, course_dim, on='courseId')
-    responses_joined_with_courses.drop(columns=['courseId'], inplace=True)
-
-    responses_from_pgls = responses_joined_with_courses[responses_joined_with_courses['surveyName'].str.contains(
-        'PGLS')]
-
-    # Renomeia as colunas
-    responses_from_pgls = responses_from_pgls.rename(columns={
-        'coursevalUserName': 'teacher',
-        'schoolCourseCode': 'schoolCourseCode',
-        'surveyName': 'survey',
-        'question': 'question',
-        'questionSubCategory': 'questionSubCategory',
-        'responseScale': 'responseScale',
-        'responseLegend': 'responseLegend',
-        'periodName': 'period',
-        'periodYear': 'year',
-        'courseName': 'courseName',
-        'courseNumber': 'courseNumber',
-        'responseZeroValue': 'responseZeroValue',
-        'responseValue': 'responseValue'
-    })
-
-    # Converte o ano para inteiro
-    responses_from_pgls['year'] = responses_from_pgls['year'].apply(int)
-
-    # Adiciona uma coluna "turma" com a turma e a divisão
-    responses_from_pgls.loc[:, 'classCode'] = responses_from_pgls['schoolCourseCode'].apply(
-        lambda x: x.split('.')[-1])
-    responses_from_pgls.loc[:, 'turma'] = responses_from_pgls['classCode'].apply(
-        extract_class_and_subdivision)
-    responses_from_pgls.loc[:, 'fullName'] = responses_from_pgls['fullName'].apply(
-        lambda x: x.upper())
-    
-    # Agrupa as notas por professor, curso e pesquisa
-    responses_grouped = responses_from_pgls.groupby(
-        ['departmentName', 'classCode', 'turma', 'fullName', 'lastNameFirst', 'teacher', 'email', 'survey',
-         'question', 'questionSubCategory', 'responseScale', 'responseLegend', 'period',
-         'year', 'courseName', 'courseNumber', 'schoolCourseCode', 'totalExpectedSurveys',
-         'totalSurveysTaken', 'responseRate']).agg(
-        {'responseZeroValue': 'mean', 'responseValue': 'mean'}).reset_index()
-         
-    # Ordena os dados
-    responses_grouped.sort_values(
-        by=['year', 'schoolCourseCode', 'teacher'], inplace=True)
-
-    # Reseta o índice
-    responses_grouped.reset_index(drop=True, inplace=True)
-
-    nps_teachers = responses_from_pgls[responses_from_pgls['questionSubCategory']
-                                     == 'Avaliação Geral']
-    nps_teachers = nps_teachers.groupby(['fullName', 'email', 'classCode', 'survey', 'period', 'totalExpectedSurveys',
-                                         'totalSurveysTaken', 'responseRate'])['responseValue'].apply(lambda x: x.dropna().tolist()).reset_index()
-    nps_teachers.rename(columns={'responseValue': 'nps_index'}, inplace=True)
-    nps_teachers['nps_index'] = nps_teachers['nps_index'].apply(tuple)
-    nps_teachers.drop_duplicates(inplace=True)
-    
-    promoters_count = (nps_teachers.explode('nps_index')
-        .groupby(['email', 'fullName', 'classCode', 'survey', 'period', 
-                'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate'])
-        .agg(count=('nps_index', lambda x: (x >= 9).sum()))
-        .reset_index())
-
-    detractors_count = (nps_teachers.explode('nps_index')
-        .groupby(['email', 'fullName', 'classCode', 'survey', 'period', 
-                'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate'])
-        .agg(count=('nps_index', lambda x: (x <= 7).sum()))
-        .reset_index())
-
-    total = (nps_teachers.explode('nps_index')
-        .groupby(['email', 'fullName', 'classCode', 'survey', 'period', 
-                'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate'])
-        .agg(count=('nps_index', 'count'))
-        .reset_index())
-
-    joined_nps = pd.merge(promoters_count, detractors_count, on=['email', 'fullName', 'classCode', 'survey', 'period', 'totalExpectedSurveys',
-                                                                 'totalSurveysTaken', 'responseRate'])
-    joined_nps = pd.merge(joined_nps, total, on=['email', 'fullName', 'classCode', 'survey', 'period', 'totalExpectedSurveys',
-                                                 'totalSurveysTaken', 'responseRate'])
-
-    joined_nps.columns = ['email', 'fullName', 'classCode', 'survey', 'period', 'totalExpectedSurveys',
-                          'totalSurveysTaken', 'responseRate', 'PROMOTERS', 'DETRACTORS', 'TOTAL']
-
-    joined_nps['NPS'] = ((joined_nps['PROMOTERS'] -
-                         joined_nps['DETRACTORS']) / joined_nps['TOTAL']) * 100
-
-    return responses_grouped, joined_nps
-
-
-def clear_comments(comments: tuple[str]):
-    comments_formatted = []
-    for comment in comments:
-        if len(comment) > 5:
-            comments_formatted.append(comment)
-
-    return comments_formatted
-
-
-def group_comments(comments, schoolCourseCodes):
-    # Substitui os valores das perguntas por valores mais legíveis
-    comments['question'] = comments['question'].replace({
-        'O professor continue a fazer em sala de aula. / What should the professor continue doing in this course?': 'continue_doing',
-        'O professor deixe de fazer em sala de aula. / What should the professor stop doing in the classroom?': 'stop_doing',
-        'O professor passe a fazer em sala de aula. / What should the professor start doing in the classroom?': 'start_doing'
-    })
-
-    # Filtra os comentários que possuem as perguntas de interesse e os códigos de curso da PGLS
-    comments = comments[(comments['question'].isin(['continue_doing', 'stop_doing', 'start_doing'])) & (
-        comments['crs_code'].isin(schoolCourseCodes))]
-
-    # Agrupa os comentários por codigo da turma, professor, pesquisa e pergunta
-    comments_grouped = comments.groupby(['crs_code', 'eval_username', 'survey', 'question'])[
-        'response'].apply(lambda x: x.dropna().tolist()).reset_index()
-
-    # Cria uma coluna para cada tipo resposta
-    comments_grouped = comments_grouped.pivot_table(
-        index=['crs_code', 'eval_username', 'survey'], columns='question', values='response', aggfunc='first').reset_index()
-
-    # Retira o nome das colunas
-    comments_grouped.columns.name = None
-
-    # Renomeia as colunas
-    comments_grouped.rename(columns={
-        'continue_doing': 'continue_doing_comments',
-        'stop_doing': 'stop_doing_comments',
-        'start_doing': 'start_doing_comments'
-    }, inplace=True)
-
-    # Preenche os valores nulos com uma string vazia
-    comments_grouped.fillna('', inplace=True)
-
-    # Transforma as listas de comentários em tuplas
-    comments_grouped['continue_doing_comments'] = comments_grouped['continue_doing_comments'].apply(
-        tuple)
-    comments_grouped['stop_doing_comments'] = comments_grouped['stop_doing_comments'].apply(
-        tuple)
-    comments_grouped['start_doing_comments'] = comments_grouped['start_doing_comments'].apply(
-        tuple)
-
-    # Cria uma coluna com a turma
-    comments_grouped['turma'] = comments_grouped['crs_code'].apply(
-        lambda x: x.split('.')[-1]).apply(extract_class_and_subdivision)
-
-    # Limpa os comentários
-    comments_grouped['continue_doing_comments'] = comments_grouped['continue_doing_comments'].apply(
-        clear_comments)
-    comments_grouped['stop_doing_comments'] = comments_grouped['stop_doing_comments'].apply(
-        clear_comments)
-    comments_grouped['start_doing_comments'] = comments_grouped['start_doing_comments'].apply(
-        clear_comments)
-
-    return comments_grouped
-
-
 # Configurações da página
 st.title("Sistema de acompanhamento de turmas")
 st.write("Nessa aba é possível acompanhar o desempenho das turmas de PGLS. É ideal para entender como uma turma está indo em relação ao engajamento e satisfação com os professores e o curso.")
 
-# Busca os dados do banco e chama as funções responsáveis por modificar eles
-teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim, comments = fetch_data()
-responses_grouped, nps = group_responses(
-    teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim)
-comments_grouped = group_comments(
-    comments, responses_grouped['schoolCourseCode'].unique())
-lesson_plans = pd.read_csv('data/lesson_plans.csv')
+# Busca os dados já processados do cache compartilhado (ou do banco, se o cache expirou)
+with stage('load_data', page=PAGE) as record:
+    # Uma única busca no cache por execução, com as agregações e os índices já calculados
+    frames = load_frames()
+    responses_grouped, nps, comments_grouped = frames['responses_grouped'], frames['nps'], frames['comments_grouped']
+    category_means, survey_stats = frames['category_means'], frames['survey_stats']
+    filter_index = frames['filter_index']
+    trends, trend_index = frames['trends'], frames['trend_index']
+    ranking_index = frames['ranking_index']
+    record['rows_out'] = len(responses_grouped)
+render_admin_panel()
 
 # Cria uma lista de anos disponíveis para filtrar
-years_available = responses_grouped['year'].unique().tolist()
-years_available.sort(reverse=True)
+years_available = filter_index.years
 year = st.multiselect('Selecione o ano', years_available,
                      default=years_available)
 
-# Filtra os dados pelo ano
-responses_grouped = responses_grouped[responses_grouped['year'].isin(year)]
+# Taxa de resposta de cada pesquisa nos anos escolhidos, para comparar com a das disciplinas
+with st.expander('Taxa de resposta das pesquisas'):
+    st.dataframe(format_survey_stats(survey_stats, year), hide_index=True)
 
 # Cria uma lista com os nomes dos professores para serem filtrados
-class_codes_list = responses_grouped['turma'].unique().tolist()
+class_codes_list = filter_index.turma_options(year)
 
 # Cria a caixa de seleção para filtrar os professores
 class_codes = st.selectbox('Selecione a turma', [
@@ -340,44 +60,54 @@ if class_codes == 'Nenhuma':
     teacher = st.selectbox('Selecione o professor', ['Todos'], disabled=True)
 else:
     teacher = st.selectbox('Selecione o professor', [
-        'Todos'] + responses_grouped[responses_grouped['turma'] == class_codes]['fullName'].unique().tolist())
-
-if teacher == 'Todos':
-    dados_filtrados = responses_grouped.copy()
-    filtered_comments = comments_grouped[comments_grouped['turma'] == class_codes]
-else:
-    dados_filtrados = responses_grouped[responses_grouped['fullName'] == teacher].copy()
-    teacher_username = teachers[teachers['fullName'] == teacher]['coursevalUserName'].values[0]
-    filtered_comments = comments_grouped[comments_grouped['eval_username'] == teacher_username].copy()
+        'Todos'] + responses_grouped.loc[filter_index.rows(year, turma=class_codes), 'fullName'].unique().tolist())
+
+# Filtra os dados pelo ano, turma e professor usando os índices, sem varrer o dataframe
+selected_class = None if class_codes == 'Nenhuma' else class_codes
+with stage('filter', page=PAGE, rows_in=len(responses_grouped)) as record:
+    if teacher == 'Todos':
+        dados_filtrados = responses_grouped.loc[filter_index.rows(year, turma=selected_class)]
+        filtered_comments = comments_grouped.loc[filter_index.comment_rows(turma=class_codes)]
+    else:
+        dados_filtrados = responses_grouped.loc[filter_index.rows(year, teacher=teacher, turma=selected_class)]
+        teacher_username = filter_index.username_by_teacher[teacher]
+        filtered_comments = comments_grouped.loc[filter_index.comment_rows(username=teacher_username)]
+    record['rows_out'] = len(dados_filtrados)
 
 if class_codes != 'Nenhuma':
-    # Filtra os dados pela turma
-    dados_filtrados = dados_filtrados[dados_filtrados['turma'] == class_codes]
-    dados_filtrados = pd.merge(
-        dados_filtrados, lesson_plans, left_on='classCode', right_on='codigo_turma', how='left')
+    # Busca o plano de aula só das disciplinas que serão mostradas
+    with stage('lesson_plans', page=PAGE, rows_in=len(dados_filtrados)) as record:
+        disciplinas = dados_filtrados.drop_duplicates('classCode')
+        disciplinas = disciplinas.join(lookup_lesson_plans(
+            disciplinas['classCode'], ['link', 'professores']))
+        record['rows_out'] = len(disciplinas)
 
     # Mostra as disciplinas que a turma teve
     st.write("## Disciplinas que a turma teve:")
-    for index, row in dados_filtrados.drop_duplicates('classCode').iterrows():
-        st.write(f"#### Disciplina: {row['courseName']}")
-        col1, col2, col3 = st.columns(3, vertical_alignment='center')
-        with col1:
-            st.metric(label="Ano", value=row['year'])
-        with col2:
-            st.metric(label="Período", value=row['period'])
-        with col3:
-            if pd.isna(row['link']):
-                st.metric(label="Plano de aula", value="Não disponível")
-            else:
-                st.page_link(row['link'], label="Plano de aula")
-        st.metric(label="Professores", value=row['professores'])
-        st.markdown("---")
-
-    # Agrupa as notas por categoria e faz a média das notas
-    feedbacks = dados_filtrados.groupby(['questionSubCategory', 'year', 'period', 'responseScale', 'classCode', 'turma',
-                                         'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate', 'courseName']).agg({
-                                             'responseValue': 'mean'
-                                         })
+    with stage('render_subjects', page=PAGE, rows_in=len(disciplinas)):
+        for index, row in paginate(disciplinas, 'subjects_page').iterrows():
+            st.write(f"#### Disciplina: {row['courseName']}")
+            col1, col2, col3 = st.columns(3, vertical_alignment='center')
+            with col1:
+                st.metric(label="Ano", value=row['year'])
+            with col2:
+                st.metric(label="Período", value=row['period'])
+            with col3:
+                if pd.isna(row['link']):
+                    st.metric(label="Plano de aula", value="Não disponível")
+                else:
+                    st.page_link(row['link'], label="Plano de aula")
+            st.metric(label="Professores", value=row['professores'])
+            st.markdown("---")
+
+    # Filtra as médias por categoria já calculadas e junta nas chaves da página
+    with stage('category_means', page=PAGE, rows_in=len(category_means)) as record:
+        filtered_means = category_means[(category_means['turma'] == class_codes) & (
+            category_means['year'].isin(year))]
+        if teacher != 'Todos':
+            filtered_means = filtered_means[filtered_means['fullName'] == teacher]
+        feedbacks = summarize_category_means(filtered_means)
+        record['rows_out'] = len(feedbacks)
 
     st.write('## Avaliações por categoria')
     df_feedbacks = feedbacks.reset_index()
@@ -388,16 +118,7 @@ if class_codes != 'Nenhuma':
                                 > min_responses_relative]
     
     # Renomeia os valores das categorias para facilitar a visualização
-    df_feedbacks['questionSubCategory'] = df_feedbacks['questionSubCategory'].replace({
-        'Questões relacionadas ao feedback / Feedback:': 'feedback',
-        'Questões relacionadas ao planejamento: / Course Planning and Structure:': 'planejamento',
-        'Questões relacionadas à avaliação / Assessment:': 'avaliacao',
-        'Questões relacionadas à dinâmica: / Classroom Dynamics:': 'dinamica',
-    })
-
-    # Cria uma coluna com o ano e o período
-    df_feedbacks['yearAndPeriod'] = df_feedbacks['year'].astype(
-        str) + '.' + df_feedbacks['period']
+    df_feedbacks['questionSubCategory'] = df_feedbacks['questionSubCategory'].astype(str).replace(CATEGORY_LABELS)
 
     # Filtra as categorias que não são de avaliação geral
     df_feedbacks = df_feedbacks[df_feedbacks['questionSubCategory']
@@ -412,75 +133,91 @@ if class_codes != 'Nenhuma':
         classes_to_show)]
 
     # Plota o gráfico, com a categoria no eixo x, a nota no eixo y e a cor representando a turma
-    st.line_chart(
-        df_feedbacks,
-        x='questionSubCategory',
-        x_label="Categoria",
-        y='responseValue',
-        y_label="Valor",
-        color='classCode',
-        height=600
-    )
-
-    # Total de respostas por disciplina
-    survey_info_grouped = (df_feedbacks.groupby(['classCode', 'courseName'])[[
-        'classCode', 'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate']].max())
+    with stage('render_chart', page=PAGE, rows_in=len(df_feedbacks)):
+        st.line_chart(
+            df_feedbacks,
+            x='questionSubCategory',
+            x_label="Categoria",
+            y='responseValue',
+            y_label="Valor",
+            color='classCode',
+            height=600
+        )
 
-    for index, row in survey_info_grouped.iterrows():
-        st.write(f"### Disciplina: {index[1]}")
-        col1, col2, col3, = st.columns(3)
-        with col1:
-            st.metric(label="Total de respostas esperadas",
-                      value=row['totalExpectedSurveys'])
-            st.metric(label="Promotores", value=nps[nps['classCode'] == index[0]]['PROMOTERS'].values[0])
-        with col2:
-            st.metric(label="Total de respostas recebidas",
-                      value=row['totalSurveysTaken'])
-            st.metric(label="Detratores", value=nps[nps['classCode'] == index[0]]['DETRACTORS'].values[0])
-        with col3:
-            st.metric(label="Taxa de resposta", value=row['responseRate'])
-            st.metric(label="NPS", value=nps[nps['classCode'] == index[0]]['NPS'].values[0])
-        st.markdown("---")
+    # Evolução das notas da turma em todos os períodos, lida da série histórica já calculada
+    st.write('## Evolução por período')
+    with stage('render_trends', page=PAGE, rows_in=len(trends)) as record:
+        class_trends = select_trends(trends, trend_index.get(('turma', selected_class), EMPTY), year)
+        record['rows_out'] = len(class_trends)
+        st.line_chart(
+            class_trends,
+            x='yearAndPeriod',
+            x_label="Período",
+            y='rollingMean',
+            y_label=f"Média dos últimos {TREND_WINDOW} períodos",
+            color='questionSubCategory',
+            height=400
+        )
 
-    st.write("## Comentários")
+        # Nota de cada categoria no último período e a variação em relação ao período anterior
+        latest = class_trends.drop_duplicates('questionSubCategory', keep='last')
+        for column, row in zip(st.columns(max(1, len(latest))), latest.itertuples()):
+            with column:
+                st.metric(label=row.questionSubCategory, value=round(row.responseValue, 2),
+                          delta=None if pd.isna(row.delta) else round(row.delta, 2))
+
+    # Posição de cada disciplina da turma entre as disciplinas do mesmo programa em cada ano. As disciplinas
+    # abaixo da quantidade relativa de respostas escolhida acima ficam de fora da comparação
+    st.write('## Comparação com outras disciplinas do programa')
+    with stage('render_rankings', page=PAGE, rows_in=len(ranking_index.rankings)) as record:
+        class_rankings = ranking_index.compare('classCode', classes_to_show, min_responses_relative)
+        class_rankings = class_rankings[class_rankings['year'].isin(year)]
+        record['rows_out'] = len(class_rankings)
+        st.dataframe(format_rankings(class_rankings), hide_index=True)
 
-    # Pega todos os comentários de um professor
-    continue_doing = 'Continue fazendo: '
-    stop_doing = 'Pare de fazer: '
-    start_doing = 'Comece a fazer: '
-    all_comments = []
+    # Total de respostas por disciplina
+    survey_info_grouped = (df_feedbacks.groupby(['classCode', 'courseName'], observed=True)[[
+        'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate']].max())
+
+    with stage('render_nps', page=PAGE, rows_in=len(survey_info_grouped)):
+        for index, row in paginate(survey_info_grouped, 'surveys_page').iterrows():
+            st.write(f"### Disciplina: {index[1]}")
+            col1, col2, col3, = st.columns(3)
+            with col1:
+                st.metric(label="Total de respostas esperadas",
+                          value=row['totalExpectedSurveys'])
+                st.metric(label="Promotores", value=nps.at[filter_index.nps_by_class[index[0]], 'PROMOTERS'])
+            with col2:
+                st.metric(label="Total de respostas recebidas",
+                          value=row['totalSurveysTaken'])
+                st.metric(label="Detratores", value=nps.at[filter_index.nps_by_class[index[0]], 'DETRACTORS'])
+            with col3:
+                st.metric(label="Taxa de resposta", value=row['responseRate'])
+                st.metric(label="NPS", value=nps.at[filter_index.nps_by_class[index[0]], 'NPS'])
+            st.markdown("---")
 
-    for index, row in filtered_comments.iterrows():
-        continue_doing += ' '.join(row['continue_doing_comments'])
-        stop_doing += ' '.join(row['stop_doing_comments'])
-        start_doing += ' '.join(row['start_doing_comments'])
+    st.write("## Comentários")
 
-    # Faz um resumo dos comentários com o GPT-4o-mini
+    # Faz um resumo dos comentários com o GPT-4o-mini, reaproveitando o resumo salvo se os comentários não mudaram
     if st.button("Gerar resumo dos comentários"):
-        response = client.chat.completions.create(
-            model='gpt-4o-mini',
-            messages=[
-                {"role": "developer", "content": st.secrets.CLASS_PROMPT},
-                {"role": "user", "content": continue_doing + stop_doing + start_doing},
-            ]
-        )
-
-        st.write(response.choices[0].message.content)
+        with stage('summary', page=PAGE, rows_in=len(filtered_comments)):
+            if SUMMARY_STREAM:
+                st.write_stream(stream_summary(client, st.secrets.CLASS_PROMPT, filtered_comments))
+            else:
+                st.write(summarize_comments(client, st.secrets.CLASS_PROMPT, filtered_comments))
     st.write('---')
-    # Mostra os comentários
-    for index, row in filtered_comments.iterrows():
-        st.write(f"Professor: {row['eval_username']}")
-        st.write(f"Comentários de {row['survey']}:")
+    # Mostra os comentários, uma página por vez
+    with stage('render_comments', page=PAGE, rows_in=len(filtered_comments)):
+        for index, row in paginate(filtered_comments, 'comments_page').iterrows():
+            st.write(f"Professor: {row['eval_username']}")
+            st.write(f"Comentários de {row['survey']}:")
 
-        st.write(f"### O que o professor deve continuar fazendo:")
-        for comment in row['continue_doing_comments']:
-            st.write(f"- {comment}")
+            st.write(f"### O que o professor deve continuar fazendo:")
+            st.markdown(comment_list(row['continue_doing_comments']))
 
-        st.write(f"### O que o professor deve parar de fazer:")
-        for comment in row['stop_doing_comments']:
-            st.write(f"- {comment}")
+            st.write(f"### O que o professor deve parar de fazer:")
+            st.markdown(comment_list(row['stop_doing_comments']))
 
-        st.write(f"### O que o professor deve começar a fazer:")
-        for comment in row['start_doing_comments']:
-            st.write(f"- {comment}")
-        st.markdown("---")
+            st.write(f"### O que o professor deve começar a fazer:")
+            st.markdown(comment_list(row['start_doing_comments']))
+            st.markdown("---")
@@ -0,0 +1,60 @@
+import pandas as pd
+import streamlit as st
+
+from utils.config import get_setting
+from utils.data import clear_data_cache, refresh_data
+from utils.database import get_pool_status
+from utils.incremental import clear_facts
+from utils.instrumentation import (INSTRUMENTATION, get_cache_counters,
+                                   recent_stages,
+                                   summarize_instrumentation_log)
+from utils.summaries import get_latency_status
+from utils.summary_batch import batch_status
+
+
+def render_admin_panel():
+    # Só mostra o painel se houver uma senha de administrador configurada
+    admin_password = get_setting('ADMIN_PASSWORD')
+    if not admin_password:
+        return
+
+    with st.sidebar.expander('Administração'):
+        password = st.text_input('Senha', type='password', key='admin_password')
+        if password != admin_password:
+            return
+
+        # Busca os dados no banco de novo e executa a página novamente
+        if st.button('Atualizar dados'):
+            refresh_data()
+            clear_data_cache()
+            st.rerun()
+
+        # Apaga os dados salvos localmente para que todo o histórico seja buscado de novo
+        if st.button('Recarregar todo o histórico'):
+            clear_facts()
+            refresh_data()
+            clear_data_cache()
+            st.rerun()
+
+        # Mostra o estado do pool de conexões com o banco
+        st.write('Pool de conexões')
+        st.json(get_pool_status())
+
+        # Mostra o andamento da geração dos resumos em segundo plano
+        st.write('Resumos dos comentários')
+        st.json(batch_status)
+
+        # Mostra o tempo até o primeiro token e o tempo total dos resumos pedidos nas páginas
+        st.write('Tempo dos resumos')
+        st.json(get_latency_status())
+
+        # Mostra os acertos e falhas dos caches da camada de dados
+        st.write('Caches')
+        st.json(get_cache_counters())
+
+        # Mostra as medições de cada etapa, se estiverem ligadas
+        if INSTRUMENTATION:
+            st.write('Últimas etapas medidas')
+            st.dataframe(pd.DataFrame(list(recent_stages)).iloc[::-1], hide_index=True)
+            st.write('Resumo do log de medições')
+            st.dataframe(summarize_instrumentation_log(), hide_index=True)
@@ -0,0 +1,77 @@
+# Nomes curtos das categorias, usados nos gráficos das páginas
+CATEGORY_LABELS = {
+    'Questões relacionadas ao feedback / Feedback:': 'feedback',
+    'Questões relacionadas ao planejamento: / Course Planning and Structure:': 'planejamento',
+    'Questões relacionadas à avaliação / Assessment:': 'avaliacao',
+    'Questões relacionadas à dinâmica: / Classroom Dynamics:': 'dinamica',
+}
+
+# Chaves usadas nas páginas para mostrar as notas por categoria de cada disciplina
+FEEDBACK_KEYS = ['questionSubCategory', 'year', 'period', 'responseScale', 'classCode', 'turma',
+                 'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate', 'courseName']
+
+
+def compute_category_means(responses_grouped):
+    # Soma e conta as notas por professor, disciplina e categoria. Guardar a soma e a contagem
+    # permite calcular a média exata de qualquer recorte (professor, turma, vários professores)
+    category_means = responses_grouped.groupby(['fullName'] + FEEDBACK_KEYS, observed=True).agg(
+        responseValue_sum=('responseValue', 'sum'),
+        responseValue_count=('responseValue', 'count')).reset_index()
+
+    category_means['responseValue'] = category_means['responseValue_sum'] / \
+        category_means['responseValue_count']
+
+    return category_means
+
+
+def summarize_category_means(category_means):
+    # Junta as médias já filtradas nas chaves das páginas, sem voltar às respostas
+    feedbacks = category_means.groupby(FEEDBACK_KEYS, observed=True)[
+        ['responseValue_sum', 'responseValue_count']].sum()
+    feedbacks['responseValue'] = feedbacks['responseValue_sum'] / \
+        feedbacks['responseValue_count']
+
+    return feedbacks[['responseValue']]
+
+
+def compute_survey_stats(responses_grouped):
+    # Cada disciplina aparece uma vez por pesquisa, com o total esperado, o total recebido e a taxa de resposta
+    surveys = responses_grouped.drop_duplicates(
+        ['survey', 'classCode', 'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate'])
+
+    survey_stats = surveys.groupby(['survey', 'year', 'period'], observed=True).agg(
+        classes=('classCode', 'nunique'),
+        totalExpectedSurveys=('totalExpectedSurveys', 'sum'),
+        totalSurveysTaken=('totalSurveysTaken', 'sum'),
+        meanResponseRate=('responseRate', 'mean'),
+        medianResponseRate=('responseRate', 'median'),
+        minResponseRate=('responseRate', 'min'),
+        maxResponseRate=('responseRate', 'max')).reset_index()
+
+    survey_stats['overallResponseRate'] = 100 * survey_stats['totalSurveysTaken'] / \
+        survey_stats['totalExpectedSurveys']
+
+    return survey_stats
+
+
+# Nomes das colunas da taxa de resposta das pesquisas mostrada nas páginas
+SURVEY_STATS_LABELS = {
+    'survey': 'Pesquisa',
+    'year': 'Ano',
+    'period': 'Período',
+    'classes': 'Disciplinas',
+    'totalExpectedSurveys': 'Respostas esperadas',
+    'totalSurveysTaken': 'Respostas recebidas',
+    'overallResponseRate': 'Taxa de resposta',
+    'medianResponseRate': 'Mediana por disciplina',
+    'minResponseRate': 'Menor',
+    'maxResponseRate': 'Maior',
+}
+
+
+def format_survey_stats(survey_stats, years):
+    # Taxa de resposta de cada pesquisa nos anos escolhidos, com as porcentagens arredondadas
+    table = survey_stats[survey_stats['year'].isin(years)].sort_values(['year', 'period'], ascending=False)
+    rates = ['overallResponseRate', 'medianResponseRate', 'minResponseRate', 'maxResponseRate']
+
+    return table.assign(**table[rates].round(1))[list(SURVEY_STATS_LABELS)].rename(columns=SURVEY_STATS_LABELS)
@@ -0,0 +1,45 @@
+import os
+
+import streamlit as st
+
+# Configurações definidas pelos scripts de linha de comando, que têm prioridade sobre o secrets.toml
+_overrides = {}
+
+
+def override_setting(name, value):
+    _overrides[name] = value
+
+
+def get_setting(name, default=None):
+    # Busca a configuração no secrets.toml e, se não existir, nas variáveis de ambiente.
+    # Assim os scripts de linha de comando também funcionam sem o Streamlit rodando
+    if name in _overrides:
+        return _overrides[name]
+
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+
+    return os.environ.get(name, default)
+
+
+def get_bool_setting(name, default=False):
+    # Configurações de ligar e desligar. No secrets.toml são booleanos, mas nas variáveis de ambiente são texto
+    value = get_setting(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'sim')
+    return bool(value)
+
+
+def parse_years(years):
+    # Os anos podem vir como lista (secrets.toml ou linha de comando) ou como texto separado por vírgulas
+    # (variável de ambiente, como LOAD_YEARS=2023,2024). Retorna os anos como texto, como no banco,
+    # ou None para carregar todo o histórico
+    if not years:
+        return None
+    if isinstance(years, (str, int)):
+        years = [years]
+
+    return sorted({part.strip() for year in years for part in str(year).split(',') if part.strip()}) or None
@@ -0,0 +1,103 @@
+import streamlit as st
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.config import get_setting, parse_years
+from utils.indexes import build_filter_index
+from utils.instrumentation import count_cache, record_cache_miss, stage, track_cache
+from utils.pipeline import build_frames, fetch_raw_data
+from utils.rankings import build_ranking_index
+from utils.snapshot import load_snapshot, save_snapshot, snapshot_age
+from utils.summary_batch import start_summary_batch
+from utils.trends import build_trend_index
+
+# Tempo (em segundos) que os dados ficam guardados em cache antes de serem buscados novamente no banco
+CACHE_TTL = int(get_setting('CACHE_TTL', 60 * 60))
+
+# Modo de busca dos dados: "joined" (uma única query com os joins no banco), "incremental"
+# (a mesma query, mas só dos períodos novos, juntando com os dados salvos localmente) ou "legacy"
+QUERY_MODE = get_setting('QUERY_MODE', 'joined')
+
+# Anos que devem ser carregados do banco. Se não for configurado, carrega todo o histórico
+LOAD_YEARS = parse_years(get_setting('LOAD_YEARS'))
+
+# Idade máxima (em segundos) do snapshot em disco para ele ser usado sem consultar o banco
+SNAPSHOT_MAX_AGE = int(get_setting('SNAPSHOT_MAX_AGE', CACHE_TTL))
+
+
+# O cache é compartilhado por todas as sessões do processo. Se várias sessões pedirem os dados ao
+# mesmo tempo, o Streamlit garante que só uma delas vai ao banco e as outras esperam o resultado
+@st.cache_data(ttl=CACHE_TTL, show_spinner='Buscando os dados no banco...')
+def _load_raw_data():
+    record_cache_miss('raw_data')
+    return fetch_raw_data(QUERY_MODE, LOAD_YEARS)
+
+
+def load_raw_data():
+    return track_cache('raw_data', _load_raw_data)
+
+
+def build_data():
+    # Busca os dados no banco, processa e salva uma nova versão do snapshot
+    frames = build_frames(*load_raw_data())
+    with stage('save_snapshot'):
+        save_snapshot(frames)
+
+    # Gera em segundo plano os resumos dos comentários novos, para que já estejam prontos quando forem pedidos
+    start_summary_batch(frames['comments_grouped'])
+
+    return frames
+
+
+def read_frames():
+    # Usa o snapshot salvo em disco (pelas páginas ou pelo etl.py) se ele for recente, sem precisar ir ao banco
+    with stage('load_snapshot'):
+        snapshot = load_snapshot()
+    if snapshot is not None and snapshot_age(snapshot[1]) < SNAPSHOT_MAX_AGE:
+        count_cache('snapshot', hit=True)
+        return snapshot[0]
+    count_cache('snapshot', hit=False)
+
+    try:
+        return build_data()
+    except (SQLAlchemyError, OSError):
+        # Se o banco estiver fora do ar, continua funcionando com o último snapshot
+        if snapshot is None:
+            raise
+        frames, manifest = snapshot
+        st.warning(
+            f"Não foi possível acessar o banco de dados. Mostrando os dados de {manifest['created_at']}.")
+        return frames
+
+
+# Os dataframes são compartilhados entre as sessões sem serem copiados a cada execução,
+# então as páginas nunca devem alterá-los diretamente (só filtrar ou copiar)
+@st.cache_resource(ttl=CACHE_TTL, show_spinner='Carregando os dados...')
+def _load_frames():
+    record_cache_miss('frames')
+    frames = dict(read_frames())
+
+    # Monta os índices dos filtros junto com os dados, para que eles sempre correspondam à mesma carga
+    with stage('build_filter_index', rows_in=len(frames['responses_grouped'])):
+        frames['filter_index'] = build_filter_index(
+            frames['teachers'], frames['responses_grouped'], frames['nps'], frames['comments_grouped'])
+        frames['trend_index'] = build_trend_index(frames['trends'])
+        frames['ranking_index'] = build_ranking_index(frames['rankings'])
+
+    return frames
+
+
+def load_frames():
+    # As páginas chamam uma vez por execução, então o contador de acertos do cache conta uma vez por execução
+    return track_cache('frames', _load_frames)
+
+
+def clear_data_cache():
+    # Invalida o cache para que a próxima execução busque os dados novamente no banco
+    _load_raw_data.clear()
+    _load_frames.clear()
+
+
+def refresh_data():
+    # Busca os dados no banco agora, sem esperar o cache ou o snapshot em disco expirarem
+    clear_data_cache()
+    build_data()
@@ -0,0 +1,318 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import bindparam, create_engine, event, text
+
+from utils.config import get_bool_setting, get_setting, parse_years
+from utils.instrumentation import stage
+from utils.processing import (COMMENT_QUESTIONS, RESPONSE_KEY_COLUMNS,
+                              aggregate_responses)
+
+
+@dataclass
+class PoolStats:
+    # Métricas do pool de conexões, usadas para dimensionar o pool_size e o max_overflow
+    checkouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    checkins: int = 0
+    total_checkout_time: float = 0.0
+    max_checkout_time: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def record_checkout_time(self, seconds):
+        with self.lock:
+            self.checkins += 1
+            self.total_checkout_time += seconds
+            self.max_checkout_time = max(self.max_checkout_time, seconds)
+
+
+pool_stats = PoolStats()
+
+
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    # Cria um único engine por processo, com um pool de conexões compartilhado por todas as sessões
+    engine = create_engine(
+        get_setting('DATABASE_URL'),
+        pool_size=int(get_setting('DB_POOL_SIZE', 5)),
+        max_overflow=int(get_setting('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=float(get_setting('DB_POOL_TIMEOUT', 30)),
+        pool_pre_ping=get_bool_setting('DB_POOL_PRE_PING', True),
+        pool_recycle=int(get_setting('DB_POOL_RECYCLE', 1800)),
+    )
+
+    # Mede quanto tempo cada conexão fica fora do pool
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checkout_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checkout_started', None)
+        if started is not None:
+            pool_stats.record_checkout_time(time.perf_counter() - started)
+
+    return engine
+
+
+def checkout_connection():
+    # Pega uma conexão do pool, medindo o tempo de espera
+    started = time.perf_counter()
+    conn = get_engine().connect()
+    pool_stats.record_wait(time.perf_counter() - started)
+
+    return conn
+
+
+def get_pool_status():
+    # Resume o estado atual do pool e as métricas acumuladas desde o início do processo
+    pool = get_engine().pool
+    with pool_stats.lock:
+        checkouts = pool_stats.checkouts
+        checkins = pool_stats.checkins
+        status = {
+            'pool_size': pool.size() if hasattr(pool, 'size') else None,
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+            'checkouts': checkouts,
+            'avg_wait_ms': 1000 * pool_stats.total_wait / checkouts if checkouts else 0.0,
+            'max_wait_ms': 1000 * pool_stats.max_wait,
+            'avg_checkout_ms': 1000 * pool_stats.total_checkout_time / checkins if checkins else 0.0,
+            'max_checkout_ms': 1000 * pool_stats.max_checkout_time,
+        }
+
+    return status
+
+
+# Filtros aplicados no banco para trazer só as respostas de professores ativos em pesquisas da PGLS
+PGLS_FILTER = """
+    p.personStatus = :person_status
+    AND p.facultyYn = :faculty_yn
+    AND s.surveyName LIKE :survey_pattern
+"""
+
+# Busca as respostas dos professores ativos da PGLS já juntas com todas as dimensões, numa única query.
+# Os filtros são passados como parâmetros para que o texto da query seja sempre o mesmo
+RESPONSES_QUERY = """
+    SELECT
+        r.responseValue, r.responseZeroValue, r.surveyId, r.surveyAssessmentFactId, r.questionId, r.responseSetId,
+        r.periodId, r.courseId, r.personAssesseeId,
+        p.departmentName, p.fullName, p.lastNameFirst, p.coursevalUserName, p.email,
+        s.surveyName,
+        sa.totalExpectedSurveys, sa.totalSurveysTaken, sa.responseRate,
+        q.question, q.questionSubCategory,
+        rs.responseScale, rs.responseLegend,
+        pe.periodName, pe.periodYear,
+        c.courseName, c.courseNumber, c.schoolCourseCode
+    FROM tb_course_evaluation_responseLikertFact r
+    JOIN tb_course_evaluation_personDim p ON p.personId = r.personAssesseeId
+    JOIN tb_course_evaluation_surveyDim s ON s.surveyId = r.surveyId
+    JOIN tb_course_evaluation_surveyAssessmentFact sa ON sa.surveyAssessmentFactId = r.surveyAssessmentFactId
+    JOIN tb_course_evaluation_questionDim q ON q.questionId = r.questionId
+    JOIN tb_course_evaluation_responseSetDim rs ON rs.responseSetId = r.responseSetId AND rs.responseValue = r.responseValue
+    JOIN tb_course_evaluation_periodDim pe ON pe.periodId = r.periodId
+    JOIN tb_course_evaluation_courseDim c ON c.courseId = r.courseId
+    WHERE {filters}
+"""
+
+# Busca só os comentários das três perguntas usadas e das disciplinas que têm respostas da PGLS
+COMMENTS_QUERY = """
+    SELECT crs_code, eval_username, question, survey, response FROM tb_course_evaluation_results_Comments
+    WHERE question IN :comment_questions
+    AND crs_code IN (
+        SELECT c.schoolCourseCode
+        FROM tb_course_evaluation_responseLikertFact r
+        JOIN tb_course_evaluation_personDim p ON p.personId = r.personAssesseeId
+        JOIN tb_course_evaluation_surveyDim s ON s.surveyId = r.surveyId
+        JOIN tb_course_evaluation_periodDim pe ON pe.periodId = r.periodId
+        JOIN tb_course_evaluation_courseDim c ON c.courseId = r.courseId
+        WHERE {filters}
+    )
+"""
+
+
+def build_query(query, years=None, min_period_id=None):
+    # Monta a query com os filtros da PGLS e, se houver, com o filtro de anos e de período mínimo
+    years = parse_years(years)
+    filters = PGLS_FILTER
+    params = {
+        'person_status': 'Active',
+        'faculty_yn': 'Y',
+        'survey_pattern': '%PGLS%',
+    }
+    if years:
+        filters += "    AND pe.periodYear IN :years\n"
+        params['years'] = years
+    if min_period_id is not None:
+        filters += "    AND r.periodId >= :min_period_id\n"
+        params['min_period_id'] = min_period_id
+
+    statement = text(query.format(filters=filters))
+    if years:
+        statement = statement.bindparams(bindparam('years', expanding=True))
+    if ':comment_questions' in query:
+        statement = statement.bindparams(
+            bindparam('comment_questions', expanding=True))
+        params['comment_questions'] = list(COMMENT_QUESTIONS)
+
+    return statement, params
+
+
+# Tipos compactos das colunas da tabela de respostas: ids em int32 e notas em float32
+RESPONSE_DTYPES = {'responseValue': 'float32', 'responseZeroValue': 'float32'} | \
+    {column: 'int32' for column in RESPONSE_KEY_COLUMNS if column != 'responseValue'}
+
+
+def read_responses(query, conn, params=None, dtype=None):
+    # Lê as respostas em blocos com um cursor no servidor e agrega cada bloco nas chaves dos agrupamentos.
+    # O pico de memória fica no tamanho do bloco mais o resultado agregado, e não no tamanho do histórico
+    chunk_size = int(get_setting('FETCH_CHUNK_SIZE', 50_000))
+    chunks = pd.read_sql_query(
+        query,
+        conn.execution_options(stream_results=True),
+        params=params,
+        chunksize=chunk_size,
+        dtype=dtype)
+
+    # As partes agregadas são juntadas quando passam do tamanho do que já foi juntado,
+    # assim a lista não cresce com o histórico e cada linha é reagrupada poucas vezes
+    parts = []
+    pending = 0
+    for chunk in chunks:
+        parts.append(aggregate_responses(chunk))
+        pending += len(parts[-1])
+        if pending > max(chunk_size, len(parts[0])):
+            parts = [aggregate_responses(pd.concat(parts, ignore_index=True))]
+            pending = 0
+
+    if len(parts) == 1:
+        return parts[0]
+    return aggregate_responses(pd.concat(parts, ignore_index=True))
+
+
+def fetch_joined_data(years=None, min_period_id=None):
+    # Pega uma conexão do pool compartilhado, que volta ao pool ao final mesmo se alguma consulta falhar
+    with checkout_connection() as conn:
+        query = """
+            SELECT departmentName, personId, fullName, lastNameFirst, coursevalUserName, email FROM tb_course_evaluation_personDim
+            WHERE personStatus == 'Active'
+            AND facultyYn == 'Y'
+        """
+        teachers = pd.read_sql_query(query, conn)
+
+        # Lê o resultado em blocos, já agregados, sem montar a resposta inteira no driver nem no pandas
+        query, params = build_query(RESPONSES_QUERY, years, min_period_id)
+        responses_joined = read_responses(query, conn, params, RESPONSE_DTYPES)
+
+        # Busca os comentários já filtrados no banco
+        query, params = build_query(COMMENTS_QUERY, years, min_period_id)
+        comments = pd.read_sql_query(query, conn, params=params)
+
+    return teachers, responses_joined, comments
+
+
+# Quantidade de consultas feitas ao mesmo tempo no modo "legacy", cada uma com a sua conexão do pool
+FETCH_CONCURRENCY = int(get_setting('FETCH_CONCURRENCY', 4))
+
+
+def read_query(name, query, params=None, read=pd.read_sql_query):
+    # Executa uma consulta com uma conexão própria do pool, para poder rodar em paralelo com as outras
+    conn = checkout_connection()
+    try:
+        with stage(f'query_{name}') as record:
+            df = read(query, conn, params=params)
+            record['rows_out'] = len(df)
+    finally:
+        conn.close()
+
+    return df
+
+
+def fetch_data(years=None):
+    years = parse_years(years)
+
+    # Os comentários não dependem das respostas, então já começam a ser buscados em paralelo
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        query, params = build_query(COMMENTS_QUERY, years)
+        comments_future = executor.submit(read_query, 'comments', query, params)
+
+        # Busca todos os campos da tabela de pessoas onde ela está ativa na escola, é um professor e o nome do programa é Not Applicable
+        query = """
+            SELECT departmentName, personId, fullName, lastNameFirst, coursevalUserName, email FROM tb_course_evaluation_personDim
+            WHERE personStatus == 'Active'
+            AND facultyYn == 'Y'
+        """
+
+        # Executa a query e coloca o resultado em um DataFrame
+        teachers = read_query('teachers', query)
+
+        # Pega os ids dos professores
+        teachers_ids = teachers['personId'].unique()
+        # Coloca os ids em uma só string separado por vírgulas
+        teachers_ids_str = ', '.join(map(str, teachers_ids))
+
+        # Busca pelas respostas as quais remetem aos professores da PGLS
+        # Só traz as respostas de pesquisas da PGLS e, se houver, dos anos escolhidos
+        query = f"""
+            SELECT responseValue, responseZeroValue, surveyId, surveyAssessmentFactId, questionId, responseSetId, periodId, courseId, personAssesseeId FROM tb_course_evaluation_responseLikertFact
+            WHERE personAssesseeId IN ({teachers_ids_str})
+            AND surveyId IN (SELECT surveyId FROM tb_course_evaluation_surveyDim WHERE surveyName LIKE :survey_pattern)
+        """
+        params = {'survey_pattern': '%PGLS%'}
+        if years:
+            query += "    AND periodId IN (SELECT periodId FROM tb_course_evaluation_periodDim WHERE periodYear IN :years)\n"
+            params['years'] = years
+        query = text(query)
+        if years:
+            query = query.bindparams(bindparam('years', expanding=True))
+        responses = read_query('responses', query, params,
+                               read=partial(read_responses, dtype=RESPONSE_DTYPES))
+
+        # Com os ids das respostas, as tabelas de dimensão são independentes entre si e são buscadas em paralelo
+        def ids_str(column):
+            return ', '.join(map(str, responses[column].unique()))
+
+        dimension_queries = {
+            'surveys': f"""
+                SELECT surveyId, surveyName FROM tb_course_evaluation_surveyDim
+                WHERE surveyId in ({ids_str('surveyId')})
+            """,
+            'survey_assessment_facts': f"""
+                SELECT surveyAssessmentFactId, totalExpectedSurveys, totalSurveysTaken, responseRate FROM tb_course_evaluation_surveyAssessmentFact
+                WHERE surveyAssessmentFactId in ({ids_str('surveyAssessmentFactId')})
+            """,
+            'questions': f"""
+                SELECT questionId, question, questionSubCategory FROM tb_course_evaluation_questionDim
+                WHERE questionId in ({', '.join(map(str, responses['questionId'].sort_values().unique()))})
+            """,
+            'response_sets': f"""
+                SELECT responseScale, responseSetId, responseValue, responseLegend FROM tb_course_evaluation_responseSetDim
+                WHERE responseSetId in ({ids_str('responseSetId')})
+            """,
+            'periods': f"""
+                SELECT periodId, periodName, periodYear FROM tb_course_evaluation_periodDim
+                WHERE periodId in ({ids_str('periodId')})
+            """,
+            'courses': f"""
+                SELECT courseId, courseName, courseNumber, schoolCourseCode FROM tb_course_evaluation_courseDim
+                WHERE courseId in ({ids_str('courseId')})
+            """,
+        }
+        futures = {name: executor.submit(read_query, name, query)
+                   for name, query in dimension_queries.items()}
+        dimensions = {name: future.result() for name, future in futures.items()}
+        comments = comments_future.result()
+
+    return teachers, responses, dimensions['surveys'], dimensions['survey_assessment_facts'], dimensions['questions'], dimensions['response_sets'], dimensions['periods'], dimensions['courses'], comments
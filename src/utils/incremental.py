@@ -0,0 +1,109 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from utils.config import get_setting, parse_years
+from utils.database import fetch_joined_data
+
+# Pasta onde ficam as respostas e os comentários já baixados do banco
+FACTS_DIR = Path(get_setting('FACTS_DIR', 'data/store/facts'))
+
+# Colunas das respostas que vêm do cadastro dos professores e são atualizadas a cada busca
+TEACHER_COLUMNS = ['departmentName', 'fullName', 'lastNameFirst', 'coursevalUserName', 'email']
+
+
+def _write_parquet(df, path):
+    # Escreve num arquivo temporário e só depois substitui o antigo, para nunca deixar um arquivo pela metade
+    tmp_path = path.with_suffix('.tmp')
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def load_facts():
+    # Lê os dados salvos localmente. Retorna None se ainda não houver nada salvo
+    state_path = FACTS_DIR / 'state.json'
+    if not state_path.exists():
+        return None
+
+    state = json.loads(state_path.read_text())
+    teachers = pd.read_parquet(FACTS_DIR / 'teachers.parquet')
+    responses_joined = pd.read_parquet(FACTS_DIR / 'responses.parquet')
+    comments = pd.read_parquet(FACTS_DIR / 'comments.parquet')
+
+    return teachers, responses_joined, comments, state
+
+
+def save_facts(teachers, responses_joined, comments, state):
+    FACTS_DIR.mkdir(parents=True, exist_ok=True)
+    _write_parquet(teachers, FACTS_DIR / 'teachers.parquet')
+    _write_parquet(responses_joined, FACTS_DIR / 'responses.parquet')
+    _write_parquet(comments, FACTS_DIR / 'comments.parquet')
+
+    # O state.json é escrito por último, assim ele só aponta para arquivos completos
+    tmp_path = FACTS_DIR / 'state.tmp'
+    tmp_path.write_text(json.dumps(state))
+    os.replace(tmp_path, FACTS_DIR / 'state.json')
+
+
+def clear_facts():
+    # Apaga os dados locais, forçando a próxima atualização a buscar todo o histórico
+    for name in ('state.json', 'teachers.parquet', 'responses.parquet', 'comments.parquet'):
+        (FACTS_DIR / name).unlink(missing_ok=True)
+
+
+def refresh_facts(years=None):
+    # Busca no banco só os períodos a partir do último período carregado e junta com os dados locais.
+    # O último período é buscado de novo porque ele ainda pode estar recebendo respostas
+    years = parse_years(years)
+    saved = load_facts()
+    if saved is not None and saved[3].get('years') != years:
+        # Os anos configurados mudaram, então os dados salvos não servem mais
+        saved = None
+    elif saved is not None and 'responseCount' not in saved[1].columns:
+        # Dados salvos antes das respostas serem pré-agregadas, que não podem ser juntados com os novos
+        saved = None
+
+    watermark = saved[3]['watermark'] if saved is not None else None
+    teachers, new_responses, new_comments = fetch_joined_data(years, watermark)
+
+    if saved is None:
+        responses_joined, comments = new_responses, new_comments
+    else:
+        _, old_responses, old_comments, _ = saved
+
+        # Substitui os períodos que foram buscados de novo
+        old_responses = old_responses[old_responses['periodId'] < watermark]
+
+        # Os dados salvos têm os professores como estavam quando foram buscados. Mantém só os que continuam no
+        # cadastro atual (ativos e professores) e atualiza os nomes, o departamento e o email, como na carga completa
+        registry = teachers.drop_duplicates('personId').set_index('personId')
+        old_responses = old_responses[old_responses['personAssesseeId'].isin(registry.index)].copy()
+        for column in TEACHER_COLUMNS:
+            old_responses[column] = old_responses['personAssesseeId'].map(registry[column])
+
+        responses_joined = pd.concat(
+            [old_responses, new_responses], ignore_index=True)
+
+        # Os comentários não têm período, então são substituídos pelas disciplinas que vieram de novo. Como na
+        # carga completa, só ficam as disciplinas que ainda têm respostas de algum professor do cadastro
+        old_comments = old_comments[~old_comments['crs_code'].isin(
+            new_comments['crs_code'])]
+        old_comments = old_comments[old_comments['crs_code'].isin(
+            responses_joined['schoolCourseCode'])]
+        comments = pd.concat([old_comments, new_comments], ignore_index=True)
+
+    if not responses_joined.empty:
+        watermark = int(responses_joined['periodId'].max())
+
+    save_facts(teachers, responses_joined, comments, {
+        'watermark': watermark,
+        'years': years,
+        'updated_at': datetime.now().isoformat(timespec='seconds'),
+        'new_responses': len(new_responses),
+        'new_comments': len(new_comments),
+    })
+
+    return teachers, responses_joined, comments
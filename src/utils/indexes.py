@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+EMPTY = np.array([], dtype=np.int64)
+
+
+def row_indices(df, keys):
+    # Dicionário chave -> rótulos das linhas, montado numa única passada pelo dataframe
+    return {key: np.asarray(df.index[positions])
+            for key, positions in df.groupby(keys, observed=True, sort=False).indices.items()}
+
+
+@dataclass
+class FilterIndex:
+    # Índices montados uma vez por carga dos dados, para que os filtros e as listas dos
+    # seletores das páginas sejam consultas em dicionários em vez de varrer o dataframe inteiro.
+    # As linhas são rótulos do índice dos dataframes, usados com .loc. Os dataframes carregados
+    # sempre têm um RangeIndex, então os rótulos também são as posições das linhas
+    years: list
+    year_by_row: np.ndarray
+    rows_by_teacher: dict
+    rows_by_turma: dict
+    rows_by_year: dict
+    teachers_by_year: dict
+    first_row_by_turma_year: dict
+    nps_by_class: dict
+    nps_by_teacher_class: dict
+    username_by_teacher: dict
+    comments_by_turma: dict
+    comments_by_username: dict
+
+    def rows(self, years, teacher=None, turma=None):
+        # Linhas das respostas dos anos escolhidos e, se houver, do professor e da turma
+        if teacher is None and turma is None:
+            if set(years) >= set(self.years):
+                return np.arange(len(self.year_by_row))
+            return np.sort(np.concatenate([EMPTY] + [self.rows_by_year.get(year, EMPTY) for year in years]))
+
+        # Começa pelo filtro mais seletivo e só depois confere o ano das poucas linhas que sobraram
+        rows = self.rows_by_teacher.get(
+            teacher, EMPTY) if teacher is not None else None
+        if turma is not None:
+            turma_rows = self.rows_by_turma.get(turma, EMPTY)
+            rows = turma_rows if rows is None else np.intersect1d(
+                rows, turma_rows, assume_unique=True)
+
+        return rows[np.isin(self.year_by_row[rows], list(years))]
+
+    def teacher_options(self, years):
+        # Professores com respostas nos anos escolhidos, em ordem alfabética
+        return sorted(set().union(*(self.teachers_by_year.get(year, ()) for year in years)))
+
+    def turma_options(self, years):
+        # Turmas com respostas nos anos escolhidos, na ordem em que aparecem nos dados
+        first_rows = {}
+        for (turma, year), row in self.first_row_by_turma_year.items():
+            if year in years and row < first_rows.get(turma, np.inf):
+                first_rows[turma] = row
+
+        return sorted(first_rows, key=first_rows.get)
+
+    def comment_rows(self, turma=None, username=None):
+        # Linhas dos comentários da turma e/ou do professor
+        rows = None
+        if turma is not None:
+            rows = self.comments_by_turma.get(turma, EMPTY)
+        if username is not None:
+            username_rows = self.comments_by_username.get(username, EMPTY)
+            rows = username_rows if rows is None else np.intersect1d(
+                rows, username_rows, assume_unique=True)
+
+        return EMPTY if rows is None else rows
+
+
+def build_filter_index(teachers, responses_grouped, nps, comments_grouped):
+    rows_by_year = row_indices(responses_grouped, 'year')
+    rows_by_teacher = row_indices(responses_grouped, 'fullName')
+
+    # Primeira linha de cada turma em cada ano, para manter a ordem original das turmas no seletor
+    first_row_by_turma_year = {key: rows.min() for key, rows in row_indices(
+        responses_grouped, ['turma', 'year']).items()}
+
+    teachers_by_year = {}
+    for (teacher, year) in row_indices(responses_grouped, ['fullName', 'year']):
+        teachers_by_year.setdefault(year, set()).add(teacher)
+
+    # Primeira linha do NPS de cada disciplina, e de cada disciplina de cada professor
+    nps_by_class = {key: rows[0]
+                    for key, rows in row_indices(nps, 'classCode').items()}
+    nps_by_teacher_class = {key: rows[0] for key, rows in row_indices(
+        nps, ['fullName', 'classCode']).items()}
+
+    # Usuário de cada professor, pelo nome em maiúsculas usado nas respostas
+    unique_teachers = teachers.assign(fullName=teachers['fullName'].astype(
+        str).str.upper()).drop_duplicates('fullName')
+    username_by_teacher = dict(
+        zip(unique_teachers['fullName'], unique_teachers['coursevalUserName']))
+
+    # Professores que só aparecem nas respostas do sistema antigo não estão no cadastro atual
+    answered = responses_grouped[['fullName', 'teacher']].astype(str).drop_duplicates('fullName')
+    username_by_teacher = dict(zip(answered['fullName'], answered['teacher'])) | username_by_teacher
+
+    return FilterIndex(
+        years=sorted((int(year) for year in rows_by_year), reverse=True),
+        year_by_row=responses_grouped['year'].to_numpy(),
+        rows_by_teacher=rows_by_teacher,
+        rows_by_turma=row_indices(responses_grouped, 'turma'),
+        rows_by_year=rows_by_year,
+        teachers_by_year=teachers_by_year,
+        first_row_by_turma_year=first_row_by_turma_year,
+        nps_by_class=nps_by_class,
+        nps_by_teacher_class=nps_by_teacher_class,
+        username_by_teacher=username_by_teacher,
+        comments_by_turma=row_indices(comments_grouped, 'turma'),
+        comments_by_username=row_indices(comments_grouped, 'eval_username'),
+    )
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+import psutil
+
+from utils.config import get_bool_setting, get_setting
+
+# Mede o tempo, as linhas e a memória de cada etapa das páginas e da carga dos dados. Desligado por padrão
+INSTRUMENTATION = get_bool_setting('INSTRUMENTATION', False)
+
+# Arquivo onde cada medição é acrescentada, uma por linha em JSON
+INSTRUMENTATION_LOG = Path(get_setting(
+    'INSTRUMENTATION_LOG', 'data/store/instrumentation.jsonl'))
+
+# Tamanho máximo (em bytes) do log. Ao passar dele, o arquivo vira <log>.1 (substituindo o anterior)
+# e um novo é começado, então o disco usado fica em até duas vezes esse tamanho
+INSTRUMENTATION_LOG_MAX_BYTES = int(get_setting('INSTRUMENTATION_LOG_MAX_BYTES', 10 * 2 ** 20))
+
+# Quantidade de medições mais recentes do log usadas no resumo do painel de administração
+INSTRUMENTATION_SUMMARY_LINES = int(get_setting('INSTRUMENTATION_SUMMARY_LINES', 5000))
+
+_process = psutil.Process()
+_log_lock = threading.Lock()
+
+# Últimas medições do processo, mostradas no painel de administração
+recent_stages = deque(maxlen=200)
+
+# Acertos e falhas dos caches da camada de dados, contados sempre porque são baratos
+cache_counters = Counter()
+_counters_lock = threading.Lock()
+_cache_misses = threading.local()
+
+
+def _append_log(record):
+    try:
+        INSTRUMENTATION_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with _log_lock:
+            if INSTRUMENTATION_LOG.exists() and INSTRUMENTATION_LOG.stat().st_size >= INSTRUMENTATION_LOG_MAX_BYTES:
+                os.replace(INSTRUMENTATION_LOG, INSTRUMENTATION_LOG.with_name(INSTRUMENTATION_LOG.name + '.1'))
+            with INSTRUMENTATION_LOG.open('a', encoding='utf-8') as log:
+                log.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    except OSError:
+        # Sem permissão de escrita, as medições continuam só em memória
+        pass
+
+
+@contextmanager
+def stage(name, page=None, rows_in=None):
+    # Mede o bloco de código. Quem chama pode preencher record['rows_out'] com as linhas geradas
+    record = {'rows_out': None}
+    if not INSTRUMENTATION:
+        yield record
+        return
+
+    memory = _process.memory_info().rss
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        measurement = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'page': page,
+            'stage': name,
+            'seconds': round(time.perf_counter() - started, 4),
+            'rows_in': rows_in,
+            'rows_out': record['rows_out'],
+            'memory_delta_mb': round((_process.memory_info().rss - memory) / 2 ** 20, 1),
+        }
+        recent_stages.append(measurement)
+        _append_log(measurement)
+
+
+def record_cache_miss(name):
+    # Chamado dentro de uma função em cache, que só é executada quando o valor não estava guardado
+    if not hasattr(_cache_misses, 'names'):
+        _cache_misses.names = set()
+    _cache_misses.names.add(name)
+
+
+def count_cache(name, hit):
+    with _counters_lock:
+        cache_counters[f"{name}_{'hit' if hit else 'miss'}"] += 1
+
+
+def track_cache(name, func, *args):
+    # Chama a função em cache e conta se o valor já estava guardado ou se ela precisou ser executada
+    if not hasattr(_cache_misses, 'names'):
+        _cache_misses.names = set()
+    _cache_misses.names.discard(name)
+    result = func(*args)
+    count_cache(name, hit=name not in _cache_misses.names)
+    _cache_misses.names.discard(name)
+
+    return result
+
+
+def get_cache_counters():
+    with _counters_lock:
+        return dict(sorted(cache_counters.items()))
+
+
+def _tail_lines(path, lines, block_size=2 ** 16):
+    # Últimas linhas do arquivo, lendo de trás para frente em blocos, sem passar pelo arquivo inteiro
+    with open(path, 'rb') as log:
+        log.seek(0, os.SEEK_END)
+        position = log.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= lines:
+            step = min(block_size, position)
+            position -= step
+            log.seek(position)
+            data = log.read(step) + data
+
+    return data.decode('utf-8', errors='ignore').splitlines()[-lines:]
+
+
+def summarize_instrumentation_log(path=INSTRUMENTATION_LOG, lines=INSTRUMENTATION_SUMMARY_LINES):
+    # Agrega as últimas medições do log por página e etapa, para ver onde o tempo está sendo gasto
+    if not Path(path).exists():
+        return pd.DataFrame()
+
+    tail = [line for line in _tail_lines(path, lines) if line.strip()]
+    if not tail:
+        return pd.DataFrame()
+    log = pd.read_json(StringIO('\n'.join(tail)), lines=True)
+    summary = log.groupby(['page', 'stage'], dropna=False).agg(
+        runs=('seconds', 'size'),
+        mean_seconds=('seconds', 'mean'),
+        p95_seconds=('seconds', lambda seconds: seconds.quantile(0.95)),
+        max_seconds=('seconds', 'max'),
+        mean_memory_delta_mb=('memory_delta_mb', 'mean'),
+    )
+
+    return summary.sort_values('mean_seconds', ascending=False).reset_index()
@@ -0,0 +1,179 @@
+from pathlib import Path
+
+import pandas as pd
+
+from utils.config import get_setting, parse_years
+from utils.processing import aggregate_responses
+
+# Pasta com as exportações do sistema de avaliação antigo, usado até a mudança de 2024
+LEGACY_DIR = Path(get_setting('LEGACY_DIR', 'data'))
+
+# Pasta com os dicionários das pesquisas antigas: categoria e escala de cada pergunta (R006 a R023)
+LEGACY_DICTIONARY_DIR = Path(get_setting('LEGACY_DICTIONARY_DIR', 'data/dictionary'))
+
+# Respostas antigas já convertidas e agregadas, que são bem mais rápidas de ler que os CSVs
+LEGACY_PARQUET = Path(get_setting(
+    'LEGACY_PARQUET', 'data/store/legacy_responses.parquet'))
+
+# Maior nota da escala atual das perguntas por categoria. As notas antigas são levadas para a escala de 1 até ela
+LIKERT_MAX = int(get_setting('LIKERT_MAX', 5))
+
+# Pesquisas antigas e o nome do arquivo de cada uma (o CSV e o dicionário)
+LEGACY_SURVEYS = {'Parcial': 'old_pgls_parcial', 'Final': 'old_pgls_final'}
+
+# Colunas das exportações antigas e as colunas equivalentes nas respostas do banco
+LEGACY_COLUMNS = {
+    'ano': 'periodYear',
+    'periodo': 'periodName',
+    'curso': 'departmentName',
+    'disciplina': 'courseName',
+    'codigo_turma': 'schoolCourseCode',
+    'professor': 'fullName',
+    'email_professor': 'email',
+}
+
+# Categoria da pergunta do NPS, que usa a escala de 0 a 10
+NPS_CATEGORY = 'Avaliação Geral'
+
+# Ids das respostas antigas, montados a partir das colunas que cada um representa no banco.
+# São negativos para não se misturarem com os ids do banco
+LEGACY_IDS = {
+    'surveyId': ['surveyName'],
+    'surveyAssessmentFactId': ['surveyName', 'schoolCourseCode', 'email'],
+    'questionId': ['question'],
+    'responseSetId': ['responseScale', 'questionSubCategory'],
+    'periodId': ['periodYear', 'periodName'],
+    'courseId': ['schoolCourseCode'],
+    'personAssesseeId': ['email'],
+}
+
+# Colunas do cadastro atual dos professores que substituem as das exportações antigas
+TEACHER_COLUMNS = ['fullName', 'lastNameFirst', 'coursevalUserName', 'departmentName', 'email']
+
+
+def legacy_files():
+    # Exportações existentes e os dicionários, cujas datas de modificação decidem se o parquet está atualizado
+    exports = [LEGACY_DIR / f'{name}.csv' for name in LEGACY_SURVEYS.values()]
+    dictionaries = [LEGACY_DICTIONARY_DIR / f'{name}_dict.csv' for name in LEGACY_SURVEYS.values()]
+
+    return [path for path in exports if path.exists()], dictionaries
+
+
+def rescale(values, scale, category):
+    # Leva as notas da escala antiga para a atual mantendo as pontas: a menor nota antiga vira a menor atual
+    # e a maior vira a maior. As escalas antigas são crescentes, com a maior nota sendo a melhor.
+    # As notas do NPS são arredondadas, para que promotores (>= 9) e detratores (<= 7) continuem bem definidos
+    old = [float(value) for value in scale.split(';')]
+    low, high = (0, 10) if category == NPS_CATEGORY else (1, LIKERT_MAX)
+    rescaled = low + (values - min(old)) * (high - low) / (max(old) - min(old))
+
+    return (rescaled.round() if category == NPS_CATEGORY else rescaled), low
+
+
+def read_export(survey, name, categories):
+    # Cada linha da exportação é uma avaliação de um aluno, com uma coluna para cada pergunta (R006, R007, ...)
+    dictionary = pd.read_csv(LEGACY_DICTIONARY_DIR / f'{name}_dict.csv', dtype=str)
+    if 'category' not in dictionary.columns:
+        # O dicionário da pesquisa parcial não tem as categorias, que são as mesmas das perguntas da final
+        dictionary['category'] = dictionary['id'].map(categories)
+
+    export = pd.read_csv(LEGACY_DIR / f'{name}.csv', dtype={column: str for column in LEGACY_COLUMNS})
+    export = export.rename(columns=LEGACY_COLUMNS)
+    export['email'] = export['email'].str.strip().str.lower()
+    export['surveyName'] = 'PGLS ' + export['periodYear'] + '.' + export['periodName'] + f' {survey} (sistema antigo)'
+
+    # Total de avaliações recebidas e esperadas de cada disciplina e professor. Sem a quantidade de matriculados,
+    # a taxa de resposta não é conhecida e fica em 100%
+    offering = export.groupby(['surveyName', 'schoolCourseCode', 'email'])['surveyName']
+    export['totalSurveysTaken'] = offering.transform('size')
+    export['totalExpectedSurveys'] = export['matriculados'] if 'matriculados' in export.columns else \
+        export['totalSurveysTaken']
+
+    # Passa para uma linha por resposta, só das perguntas que estão no dicionário
+    questions = [question for question in dictionary['id'] if question in export.columns]
+    answers = export.melt(
+        id_vars=list(LEGACY_COLUMNS.values()) + ['surveyName', 'totalSurveysTaken', 'totalExpectedSurveys'],
+        value_vars=questions, var_name='id', value_name='answer')
+    answers['answer'] = pd.to_numeric(answers['answer'], errors='coerce')
+    answers = answers.dropna(subset=['answer']).merge(dictionary, on='id')
+
+    # Reescala as notas de cada combinação de escala e categoria
+    answers['responseValue'] = 0.0
+    answers['responseZeroValue'] = 0.0
+    for (scale, category), rows in answers.groupby(['scale', 'category']).groups.items():
+        values, low = rescale(answers.loc[rows, 'answer'], scale, category)
+        answers.loc[rows, 'responseValue'] = values
+        answers.loc[rows, 'responseZeroValue'] = values - low
+
+    return answers.assign(
+        responseScale='Antiga ' + answers['scale'].str.replace(';', ' '),
+        responseLegend=answers['answer'].astype(int).astype(str),
+        questionSubCategory=answers['category'])
+
+
+def import_legacy_surveys():
+    # Converte as exportações antigas para o mesmo formato das respostas do banco, já agregado
+    exports, dictionaries = legacy_files()
+    categories = pd.concat([pd.read_csv(path, dtype=str) for path in dictionaries])
+    categories = categories.dropna(subset=['category']).drop_duplicates('id').set_index('id')['category']
+
+    responses = pd.concat([read_export(survey, name, categories) for survey, name in LEGACY_SURVEYS.items()
+                           if LEGACY_DIR / f'{name}.csv' in exports], ignore_index=True)
+
+    for column, by in LEGACY_IDS.items():
+        responses[column] = (-1 - responses.groupby(by, sort=False).ngroup()).astype('int32')
+
+    responses['lastNameFirst'] = responses['fullName']
+    responses['coursevalUserName'] = responses['email'].str.split('@').str[0]
+    responses['courseNumber'] = responses['schoolCourseCode']
+    responses['responseRate'] = (100 * responses['totalSurveysTaken'] /
+                                 responses['totalExpectedSurveys']).round(2)
+    responses = responses.astype({'responseValue': 'float32', 'responseZeroValue': 'float32'})
+
+    return aggregate_responses(responses[list(LEGACY_IDS) + [
+        'responseValue', 'responseZeroValue', 'departmentName', 'fullName', 'lastNameFirst', 'coursevalUserName',
+        'email', 'surveyName', 'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate', 'question',
+        'questionSubCategory', 'responseScale', 'responseLegend', 'periodName', 'periodYear', 'courseName',
+        'courseNumber', 'schoolCourseCode']])
+
+
+def convert_legacy_surveys():
+    # Importa as exportações e salva em parquet. É feito automaticamente sempre que um CSV for mais novo que o parquet
+    responses = import_legacy_surveys()
+    LEGACY_PARQUET.parent.mkdir(parents=True, exist_ok=True)
+    responses.to_parquet(LEGACY_PARQUET, index=False)
+
+    return responses
+
+
+def load_legacy_responses(teachers, years=None):
+    # Lê as respostas antigas do parquet, importando os CSVs de novo só quando algum deles mudar.
+    # Retorna None se não houver exportações antigas
+    exports, dictionaries = legacy_files()
+    if not exports:
+        return None
+
+    mtime = max(path.stat().st_mtime for path in exports + dictionaries)
+    if LEGACY_PARQUET.exists() and LEGACY_PARQUET.stat().st_mtime >= mtime:
+        responses = pd.read_parquet(LEGACY_PARQUET)
+    else:
+        try:
+            responses = convert_legacy_surveys()
+        except OSError:
+            # Sem permissão de escrita, importa os CSVs a cada carga
+            responses = import_legacy_surveys()
+
+    years = parse_years(years)
+    if years:
+        responses = responses[responses['periodYear'].isin(years)]
+
+    # Mantém só os professores do cadastro atual, que tem os mesmos filtros das respostas do banco (professores
+    # ativos), e usa os nomes, o departamento e o usuário do cadastro. Assim as respostas antigas aparecem junto
+    # com as novas nos filtros das páginas e o usuário corresponde ao eval_username dos comentários
+    registry = teachers.set_index(teachers['email'].str.lower())
+    registry = registry[~registry.index.duplicated()]
+    responses = responses[responses['email'].isin(registry.index)].copy()
+    for column in TEACHER_COLUMNS:
+        responses[column] = responses['email'].map(registry[column])
+
+    return responses
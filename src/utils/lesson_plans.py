@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from utils.config import get_setting
+from utils.instrumentation import record_cache_miss, stage, track_cache
+
+# Catálogo de planos de aula exportado do sistema acadêmico
+LESSON_PLANS_CSV = Path(get_setting('LESSON_PLANS_CSV', 'data/lesson_plans.csv'))
+
+# Cópia do catálogo em parquet, que é bem mais rápida de ler que o CSV
+LESSON_PLANS_PARQUET = Path(get_setting(
+    'LESSON_PLANS_PARQUET', 'data/store/lesson_plans.parquet'))
+
+
+def convert_lesson_plans():
+    # Converte o CSV para parquet. É feito automaticamente sempre que o CSV for mais novo que o parquet
+    lesson_plans = pd.read_csv(LESSON_PLANS_CSV)
+    LESSON_PLANS_PARQUET.parent.mkdir(parents=True, exist_ok=True)
+    lesson_plans.to_parquet(LESSON_PLANS_PARQUET, index=False)
+
+    return lesson_plans
+
+
+# A data de modificação do arquivo faz parte da chave do cache, então o catálogo só é lido de novo
+# quando o arquivo mudar. O cache_resource evita copiar o catálogo a cada execução da página
+@st.cache_resource(show_spinner=False)
+def _load_lesson_plans(mtime):
+    record_cache_miss('lesson_plans')
+    with stage('load_lesson_plans') as record:
+        if LESSON_PLANS_PARQUET.exists() and LESSON_PLANS_PARQUET.stat().st_mtime >= mtime:
+            lesson_plans = pd.read_parquet(LESSON_PLANS_PARQUET)
+        else:
+            try:
+                lesson_plans = convert_lesson_plans()
+            except OSError:
+                # Sem permissão de escrita, continua usando o CSV
+                lesson_plans = pd.read_csv(LESSON_PLANS_CSV)
+        record['rows_out'] = len(lesson_plans)
+
+    # Indexa pelo código da turma, mantendo só o primeiro plano de cada turma
+    lesson_plans = lesson_plans.drop_duplicates('codigo_turma')
+
+    return lesson_plans.set_index('codigo_turma')
+
+
+def load_lesson_plans():
+    return track_cache('lesson_plans', _load_lesson_plans, LESSON_PLANS_CSV.stat().st_mtime)
+
+
+def lookup_lesson_plans(class_codes, columns=('link',)):
+    # Busca os planos de aula só das turmas que serão mostradas, alinhados com as linhas recebidas
+    lesson_plans = load_lesson_plans()
+    found = lesson_plans.reindex(class_codes.astype(str), columns=list(columns))
+    found.index = class_codes.index
+
+    return found
@@ -0,0 +1,36 @@
+# Chaves do NPS mostrado nas páginas: um valor por professor, disciplina e pesquisa
+NPS_KEYS = ['email', 'fullName', 'classCode', 'survey', 'period',
+            'totalExpectedSurveys', 'totalSurveysTaken', 'responseRate']
+
+
+def _finish_nps(nps):
+    nps['NPS'] = ((nps['PROMOTERS'] - nps['DETRACTORS']) / nps['TOTAL']) * 100
+    return nps
+
+
+def compute_nps(responses, by=NPS_KEYS):
+    # Calcula promotores (nota >= 9), detratores (nota <= 7), total e NPS numa única agregação.
+    # O "by" pode ser qualquer nível: professor, disciplina, curso, ano, departamento...
+    # Nas respostas pré-agregadas cada linha vale a quantidade de respostas com aquela nota
+    general = responses[responses['questionSubCategory'] == 'Avaliação Geral']
+    values = general['responseValue']
+    counts = general['responseCount'] if 'responseCount' in general.columns else 1
+
+    nps = general.assign(
+        PROMOTERS=(values >= 9).astype('int64') * counts,
+        DETRACTORS=(values <= 7).astype('int64') * counts,
+        TOTAL=values.notna().astype('int64') * counts,
+    ).groupby(by, observed=True).agg(
+        PROMOTERS=('PROMOTERS', 'sum'),
+        DETRACTORS=('DETRACTORS', 'sum'),
+        TOTAL=('TOTAL', 'sum')).reset_index()
+
+    return _finish_nps(nps)
+
+
+def rollup_nps(nps, by):
+    # Junta um NPS já calculado num nível mais agregado, somando as contagens
+    rolled = nps.groupby(by, observed=True)[
+        ['PROMOTERS', 'DETRACTORS', 'TOTAL']].sum().reset_index()
+
+    return _finish_nps(rolled)
@@ -0,0 +1,25 @@
+import math
+
+import streamlit as st
+
+from utils.config import get_setting
+
+# Quantidade de itens (disciplinas ou grupos de comentários) mostrados por página
+PAGE_SIZE = int(get_setting('PAGE_SIZE', 10))
+
+
+def paginate(df, key, page_size=PAGE_SIZE):
+    # Mostra só uma página das linhas, para que o tempo de renderização não cresça com a quantidade de dados
+    pages = max(1, math.ceil(len(df) / page_size))
+    if pages == 1:
+        return df
+
+    # A chave inclui o tamanho dos dados para voltar à primeira página quando os filtros mudam
+    page = st.number_input(f'Página (de {pages})', min_value=1, max_value=pages,
+                           value=1, step=1, key=f'{key}_{len(df)}')
+    return df.iloc[(page - 1) * page_size:page * page_size]
+
+
+def comment_list(comments):
+    # Monta todos os comentários numa única lista em markdown, em vez de um elemento por comentário
+    return '\n'.join(f"- {' '.join(str(comment).split())}" for comment in comments)
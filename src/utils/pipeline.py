@@ -0,0 +1,87 @@
+import pandas as pd
+
+from utils.aggregates import compute_category_means, compute_survey_stats
+from utils.config import parse_years
+from utils.database import fetch_data, fetch_joined_data
+from utils.incremental import refresh_facts
+from utils.instrumentation import stage
+from utils.legacy import load_legacy_responses
+from utils.processing import group_comments, group_responses, join_responses
+from utils.rankings import compute_rankings
+from utils.trends import compute_trends
+
+
+def fetch_raw_data(query_mode='joined', years=None):
+    years = parse_years(years)
+    teachers, responses_joined, comments = fetch_database_data(query_mode, years)
+
+    # Junta as respostas do sistema de avaliação antigo (até 2024), já convertidas para o formato do banco
+    with stage('load_legacy_responses') as record:
+        legacy = load_legacy_responses(teachers, years)
+        record['rows_out'] = 0 if legacy is None else len(legacy)
+    if legacy is not None and not legacy.empty:
+        responses_joined = pd.concat(
+            [responses_joined, legacy.reindex(columns=responses_joined.columns)], ignore_index=True)
+
+    return teachers, responses_joined, comments
+
+
+def fetch_database_data(query_mode='joined', years=None):
+    # No modo "legacy" as tabelas são buscadas separadamente e juntadas no pandas.
+    # No modo "joined" (padrão) o banco já devolve as respostas juntas com as dimensões
+    if query_mode == 'legacy':
+        with stage('fetch_data') as record:
+            teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim, comments = fetch_data(years)
+            record['rows_out'] = len(responses)
+        with stage('join_responses', rows_in=len(responses)) as record:
+            responses_joined = join_responses(
+                teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim)
+            record['rows_out'] = len(responses_joined)
+        return teachers, responses_joined, comments
+    if query_mode == 'incremental':
+        with stage('refresh_facts') as record:
+            raw_data = refresh_facts(years)
+            record['rows_out'] = len(raw_data[1])
+        return raw_data
+
+    with stage('fetch_joined_data') as record:
+        raw_data = fetch_joined_data(years)
+        record['rows_out'] = len(raw_data[1])
+    return raw_data
+
+
+def build_frames(teachers, responses_joined, comments):
+    # Faz todas as transformações e agregações usadas pelas páginas
+    with stage('group_responses', rows_in=len(responses_joined)) as record:
+        responses_grouped, nps = group_responses(responses_joined)
+        record['rows_out'] = len(responses_grouped)
+    with stage('group_comments', rows_in=len(comments)) as record:
+        comments_grouped = group_comments(
+            comments, responses_grouped['schoolCourseCode'].unique())
+        record['rows_out'] = len(comments_grouped)
+    with stage('aggregates', rows_in=len(responses_grouped)) as record:
+        category_means = compute_category_means(responses_grouped)
+        survey_stats = compute_survey_stats(responses_grouped)
+        record['rows_out'] = len(category_means) + len(survey_stats)
+
+    # Série histórica de cada professor, turma e disciplina. É refeita a cada carga a partir das médias, o que
+    # é barato e mantém a série de acordo com o TREND_WINDOW e os nomes atuais
+    with stage('trends', rows_in=len(category_means)) as record:
+        trends = compute_trends(category_means)
+        record['rows_out'] = len(trends)
+
+    # Percentis de cada professor e disciplina no departamento e no programa, por ano
+    with stage('rankings', rows_in=len(responses_grouped)) as record:
+        rankings = compute_rankings(responses_grouped, nps)
+        record['rows_out'] = len(rankings)
+
+    return {
+        'teachers': teachers,
+        'responses_grouped': responses_grouped,
+        'nps': nps,
+        'comments_grouped': comments_grouped,
+        'category_means': category_means,
+        'survey_stats': survey_stats,
+        'trends': trends,
+        'rankings': rankings,
+    }
@@ -0,0 +1,259 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.nps import NPS_KEYS, compute_nps
+
+# Perguntas de comentários usadas pelo sistema e o nome mais legível de cada uma
+COMMENT_QUESTIONS = {
+    'O professor continue a fazer em sala de aula. / What should the professor continue doing in this course?': 'continue_doing',
+    'O professor deixe de fazer em sala de aula. / What should the professor stop doing in the classroom?': 'stop_doing',
+    'O professor passe a fazer em sala de aula. / What should the professor start doing in the classroom?': 'start_doing'
+}
+
+# Colunas de texto das respostas que se repetem em muitas linhas e são usadas nos agrupamentos
+DIMENSION_COLUMNS = ['departmentName', 'classCode', 'turma', 'fullName', 'lastNameFirst', 'teacher', 'email',
+                     'survey', 'question', 'questionSubCategory', 'responseScale', 'responseLegend', 'period',
+                     'courseName', 'courseNumber', 'schoolCourseCode']
+
+
+def extract_class_and_subdivision(code):
+    # Expressão regular para extrair a turma (letras e números iniciais)
+    match_class = re.match(r'^[A-Za-z]+\d+', code)
+    class_code = match_class.group(0) if match_class else code
+
+    # Expressão regular para extrair a divisão (últimos caracteres após "_", se existir)
+    match_subdivision = re.search(r'_(\w+)$', code)
+    subdivision = match_subdivision.group(1) if match_subdivision else None
+
+    # Retorna a turma com a divisão anexada, se existir
+    return f"{class_code}_{subdivision}" if subdivision else class_code
+
+
+# Resultado do parsing de cada código de disciplina já visto, compartilhado pelas respostas e pelos comentários
+_parsed_course_codes = {}
+
+
+def parse_course_codes(school_course_codes):
+    # Separa o código da turma (classCode) e a turma com a divisão (turma) de cada código de disciplina.
+    # Como há poucos códigos distintos, o parsing é feito uma vez por código e o resultado é replicado nas linhas
+    # Códigos vazios (NaN) não são analisados e ficam sem turma
+    new_codes = pd.Series([code for code in pd.unique(school_course_codes)
+                           if pd.notna(code) and code not in _parsed_course_codes], dtype=object)
+
+    if not new_codes.empty:
+        class_codes = new_codes.str.split('.').str[-1]
+
+        # Mesmas expressões do extract_class_and_subdivision, aplicadas de uma vez em todos os códigos novos
+        class_part = class_codes.str.extract(
+            r'^([A-Za-z]+\d+)', expand=False).fillna(class_codes)
+        subdivision = class_codes.str.extract(r'_(\w+)$', expand=False)
+        turmas = class_part.where(
+            subdivision.isna(), class_part + '_' + subdivision)
+
+        _parsed_course_codes.update(
+            zip(new_codes, zip(class_codes, turmas)))
+
+    # Cada coluna é replicada nas linhas com um map por código. Sem nenhum código válido o map devolve
+    # float, então as colunas são convertidas para object
+    parsed = {code: _parsed_course_codes[code] for code in pd.unique(school_course_codes) if pd.notna(code)}
+
+    return pd.DataFrame({
+        'classCode': school_course_codes.map({code: value[0] for code, value in parsed.items()}).astype(object),
+        'turma': school_course_codes.map({code: value[1] for code, value in parsed.items()}).astype(object),
+    }, index=school_course_codes.index)
+
+
+def join_responses(teachers, responses, surveys_dim, surveyAssessmentFact_dim, question_dim, response_set_dim, period_dim, course_dim):
+    # Junta as respostas com os professores
+    responses_joined_with_teachers = pd.merge(
+        responses, teachers, left_on='personAssesseeId', right_on='personId')
+    responses_joined_with_teachers.drop(
+        columns=['personId', 'personAssesseeId'], inplace=True)
+
+    # Junta as respostas com os nomes das pesquisas
+    responses_joined_with_surveys = pd.merge(
+        responses_joined_with_teachers, surveys_dim, on='surveyId')
+    responses_joined_with_surveys.drop(columns=['surveyId'], inplace=True)
+
+    # Junta as respostas com os dados das pesquisas
+    responses_joined_with_surveys = pd.merge(
+        responses_joined_with_surveys, surveyAssessmentFact_dim, on='surveyAssessmentFactId')
+    responses_joined_with_surveys.drop(
+        columns=['surveyAssessmentFactId'], inplace=True)
+
+    # Junta as perguntas às respostas
+    responses_joined_with_questions = pd.merge(
+        responses_joined_with_surveys, question_dim, on='questionId')
+    responses_joined_with_questions.drop(columns=['questionId'], inplace=True)
+
+    responses_joined_with_questions = pd.merge(
+        responses_joined_with_questions, response_set_dim, on=['responseSetId', 'responseValue'])
+    responses_joined_with_questions.drop(
+        columns=['responseSetId'], inplace=True)
+
+    # Junta os períodos às respostas
+    responses_joined_with_periods = pd.merge(
+        responses_joined_with_questions, period_dim, on='periodId')
+    responses_joined_with_periods.drop(columns=['periodId'], inplace=True)
+
+    # Junta os cursos às respostas
+    responses_joined_with_courses = pd.merge(
+        responses_joined_with_periods, course_dim, on='courseId')
+    responses_joined_with_courses.drop(columns=['courseId'], inplace=True)
+
+    return responses_joined_with_courses
+
+
+# Colunas somadas quando as respostas são pré-agregadas
+RESPONSE_SUM_COLUMNS = ['responseZeroValue_sum', 'responseZeroValue_count', 'responseCount']
+
+# Ids da tabela de respostas. Com a nota, eles definem todas as outras colunas das respostas,
+# porque cada dimensão é juntada pela sua chave
+RESPONSE_KEY_COLUMNS = ['surveyId', 'surveyAssessmentFactId', 'questionId', 'responseSetId', 'periodId',
+                        'courseId', 'personAssesseeId', 'responseValue']
+
+
+def aggregate_responses(responses):
+    # Reduz as respostas a uma linha por combinação de ids e nota, com a soma e a contagem das notas.
+    # A nota fica nas chaves porque a legenda e o NPS dependem dela, então nada se perde para as páginas.
+    # Aceita tanto respostas individuais quanto partes já agregadas, que são somadas de novo
+    if 'responseCount' not in responses.columns:
+        zero_values = responses['responseZeroValue']
+        responses = responses.drop(columns='responseZeroValue').assign(
+            responseZeroValue_sum=zero_values.astype('float64'),
+            responseZeroValue_count=zero_values.notna().astype('int64'),
+            responseCount=1)
+
+    # Agrupa pelos ids, que são números, e pega as colunas de texto da primeira linha de cada grupo
+    keys = [column for column in RESPONSE_KEY_COLUMNS if column in responses.columns]
+    grouper = responses.groupby(keys, sort=False, dropna=False)
+    aggregated = grouper.head(1).drop(columns=RESPONSE_SUM_COLUMNS).reset_index(drop=True)
+    sums = grouper[RESPONSE_SUM_COLUMNS].sum()
+    for column in RESPONSE_SUM_COLUMNS:
+        aggregated[column] = sums[column].to_numpy()
+
+    return aggregated
+
+
+def group_responses(responses_joined):
+    # Recebe as respostas já juntas com as dimensões, seja pelo join_responses ou pela query do banco
+    responses_from_pgls = responses_joined[responses_joined['surveyName'].str.contains(
+        'PGLS')]
+
+    # Renomeia as colunas
+    responses_from_pgls = responses_from_pgls.rename(columns={
+        'coursevalUserName': 'teacher',
+        'schoolCourseCode': 'schoolCourseCode',
+        'surveyName': 'survey',
+        'question': 'question',
+        'questionSubCategory': 'questionSubCategory',
+        'responseScale': 'responseScale',
+        'responseLegend': 'responseLegend',
+        'periodName': 'period',
+        'periodYear': 'year',
+        'courseName': 'courseName',
+        'courseNumber': 'courseNumber',
+        'responseZeroValue': 'responseZeroValue',
+        'responseValue': 'responseValue'
+    })
+
+    # Converte o ano para inteiro
+    responses_from_pgls['year'] = responses_from_pgls['year'].astype(int)
+
+    # Adiciona uma coluna "turma" com a turma e a divisão
+    course_codes = parse_course_codes(responses_from_pgls['schoolCourseCode'])
+    responses_from_pgls.loc[:, 'classCode'] = course_codes['classCode']
+    responses_from_pgls.loc[:, 'turma'] = course_codes['turma']
+    responses_from_pgls.loc[:, 'fullName'] = responses_from_pgls['fullName'].str.upper()
+
+    # Converte as colunas de texto em categorias. Cada valor repetido passa a ocupar só um código inteiro
+    # e o groupby e a ordenação trabalham com esses códigos em vez de comparar strings
+    responses_from_pgls = responses_from_pgls.astype(
+        {column: 'category' for column in DIMENSION_COLUMNS})
+
+    # As respostas chegam pré-agregadas, com a nota nas chaves e a quantidade de respostas de cada linha.
+    # As médias são calculadas pelas somas ponderadas por essa quantidade, ignorando notas vazias como o mean faz
+    values = responses_from_pgls['responseValue'].astype('float64')
+    counts = responses_from_pgls['responseCount']
+    responses_from_pgls = responses_from_pgls.assign(
+        responseValue_sum=values * counts, responseValue_count=counts.where(values.notna(), 0))
+
+    # Agrupa as notas por professor, curso e pesquisa
+    responses_grouped = responses_from_pgls.groupby(
+        ['departmentName', 'classCode', 'turma', 'fullName', 'lastNameFirst', 'teacher', 'email', 'survey',
+         'question', 'questionSubCategory', 'responseScale', 'responseLegend', 'period',
+         'year', 'courseName', 'courseNumber', 'schoolCourseCode', 'totalExpectedSurveys',
+         'totalSurveysTaken', 'responseRate'], observed=True)[
+        ['responseZeroValue_sum', 'responseZeroValue_count', 'responseValue_sum', 'responseValue_count']].sum()
+    responses_grouped['responseZeroValue'] = responses_grouped['responseZeroValue_sum'] / \
+        responses_grouped['responseZeroValue_count']
+    responses_grouped['responseValue'] = responses_grouped['responseValue_sum'] / \
+        responses_grouped['responseValue_count']
+    responses_grouped = responses_grouped[['responseZeroValue', 'responseValue']].reset_index()
+
+    # Ordena os dados
+    responses_grouped.sort_values(
+        by=['year', 'schoolCourseCode', 'teacher'], inplace=True)
+
+    # Reseta o índice
+    responses_grouped.reset_index(drop=True, inplace=True)
+
+    # Calcula o NPS de cada professor, disciplina e pesquisa
+    joined_nps = compute_nps(responses_from_pgls, NPS_KEYS)
+
+    return responses_grouped, joined_nps
+
+
+# Tipos de comentário e a coluna de cada um no resultado
+COMMENT_COLUMNS = {
+    'continue_doing': 'continue_doing_comments',
+    'start_doing': 'start_doing_comments',
+    'stop_doing': 'stop_doing_comments',
+}
+
+# Comentários com até essa quantidade de caracteres são descartados
+MIN_COMMENT_LENGTH = 5
+
+
+def group_comments(comments, schoolCourseCodes):
+    keys = ['crs_code', 'eval_username', 'survey']
+
+    # Substitui os valores das perguntas por valores mais legíveis, sem alterar o dataframe recebido
+    question = comments['question'].map(COMMENT_QUESTIONS).fillna(comments['question'])
+
+    # Filtra os comentários que possuem as perguntas de interesse e os códigos de curso da PGLS
+    mask = question.isin(list(COMMENT_COLUMNS)) & comments['crs_code'].isin(schoolCourseCodes)
+    comments = comments.loc[mask, keys + ['response']].assign(question=question[mask])
+    comments = comments.dropna(subset=keys)
+
+    # Sem nenhum comentário (por exemplo, um período novo que ainda não recebeu comentários) o agrupamento
+    # teria uma linha vazia, então retorna uma tabela vazia com as mesmas colunas
+    if comments.empty:
+        return pd.DataFrame(columns=keys + list(COMMENT_COLUMNS.values()) + ['turma'], dtype=object)
+
+    # Numera os grupos de codigo da turma, professor e pesquisa na mesma ordem do agrupamento
+    grouper = comments.groupby(keys, observed=True, sort=True)
+    group_ids = grouper.ngroup().to_numpy()
+    comments_grouped = grouper.size().index.to_frame(index=False)
+
+    # Limpa os comentários na tabela inteira de uma vez, antes de agrupar
+    responses = comments['response']
+    valid = (responses.str.len() > MIN_COMMENT_LENGTH).to_numpy()
+
+    # Cria uma coluna para cada tipo de resposta. Os comentários de cada tipo são ordenados pelo grupo e
+    # cortados nas fronteiras dos grupos, mantendo a ordem original dentro de cada um
+    for question_type, column in COMMENT_COLUMNS.items():
+        selected = valid & (comments['question'] == question_type).to_numpy()
+        ids = group_ids[selected]
+        order = np.argsort(ids, kind='stable')
+        counts = np.bincount(ids, minlength=len(comments_grouped))
+        values = responses.to_numpy()[selected][order]
+        comments_grouped[column] = [part.tolist() for part in np.split(values, np.cumsum(counts)[:-1])]
+
+    # Cria uma coluna com a turma
+    comments_grouped['turma'] = parse_course_codes(
+        comments_grouped['crs_code'])['turma']
+
+    return comments_grouped
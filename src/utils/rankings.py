@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from utils.aggregates import CATEGORY_LABELS
+from utils.indexes import EMPTY, row_indices
+from utils.nps import rollup_nps
+
+# Escopos em que cada tipo de entidade é comparado: professores no departamento e no programa,
+# disciplinas no programa. O programa (MBA, LLM, ...) são as letras iniciais do código da disciplina
+RANKING_SCOPES = {'fullName': ['departmentName', 'program'], 'classCode': ['program']}
+
+# Chaves de cada grupo de comparação. Os percentis são calculados entre as entidades do mesmo grupo
+RANKING_KEYS = ['entityType', 'scope', 'group', 'year', 'metric']
+
+# Nomes das colunas mostradas nas páginas
+RANKING_LABELS = {
+    'entity': 'Professor ou disciplina',
+    'scope': 'Comparado com',
+    'group': 'Grupo',
+    'year': 'Ano',
+    'metric': 'Indicador',
+    'value': 'Valor',
+    'percentile': 'Percentil',
+    'peers': 'Comparados',
+    'responseRate': 'Taxa de resposta',
+}
+SCOPE_LABELS = {'departmentName': 'departamento', 'program': 'programa'}
+
+
+def _rank(rankings):
+    # Percentil de cada entidade no seu grupo (100 é o melhor valor) e a quantidade de entidades comparadas
+    groups = rankings.groupby(RANKING_KEYS, observed=True)['value']
+    return rankings.assign(percentile=groups.rank(pct=True) * 100, peers=groups.transform('size'))
+
+
+def compute_rankings(responses_grouped, nps):
+    responses = responses_grouped.assign(program=responses_grouped['classCode'].astype(str).str.extract(
+        r'^([A-Za-z]+)', expand=False))
+
+    # Ano, departamento e programa de cada linha do NPS, que é calculado por disciplina e pesquisa
+    nps_keys = ['fullName', 'classCode', 'survey', 'period']
+    nps = nps.merge(responses.drop_duplicates(nps_keys)[nps_keys + ['year', 'departmentName', 'program']],
+                    on=nps_keys)
+
+    frames = []
+    for entity, scopes in RANKING_SCOPES.items():
+        for scope in scopes:
+            keys = [scope, 'year', entity]
+
+            # Média das notas de cada categoria, do mesmo jeito que as médias mostradas nas páginas
+            means = responses.groupby(keys + ['questionSubCategory'], observed=True).agg(
+                value=('responseValue', 'mean')).reset_index().rename(columns={'questionSubCategory': 'metric'})
+
+            # NPS juntando as contagens de promotores e detratores de todas as disciplinas da entidade
+            entity_nps = rollup_nps(nps, keys).rename(columns={'NPS': 'value'})[keys + ['value']]
+
+            # Taxa de resposta da entidade, contando cada disciplina uma vez por pesquisa
+            offerings = responses.drop_duplicates(keys + ['classCode', 'survey'])
+            rates = offerings.groupby(keys, observed=True)[['totalExpectedSurveys', 'totalSurveysTaken']].sum()
+            rates['responseRate'] = 100 * rates['totalSurveysTaken'] / rates['totalExpectedSurveys']
+
+            ranked = pd.concat([means, entity_nps.assign(metric='NPS')], ignore_index=True).astype(
+                {scope: str, entity: str, 'metric': str})
+            ranked = ranked.merge(rates['responseRate'].reset_index().astype({scope: str, entity: str}), on=keys)
+            frames.append(ranked.rename(columns={scope: 'group', entity: 'entity'}).assign(
+                entityType=entity, scope=scope))
+
+    rankings = pd.concat(frames, ignore_index=True)
+    rankings = rankings[RANKING_KEYS + ['entity', 'value', 'responseRate']].dropna(subset=['group', 'value'])
+
+    return _rank(rankings).reset_index(drop=True)
+
+
+@dataclass
+class RankingIndex:
+    # Linhas de cada entidade e de cada grupo de comparação, montadas uma vez por carga dos dados
+    rankings: pd.DataFrame
+    rows_by_entity: dict
+    rows_by_group: dict
+
+    def compare(self, entity_type, entities, min_response_rate=None):
+        # Percentis das entidades entre os seus pares. Com uma taxa de resposta mínima, os pares abaixo dela
+        # saem e os percentis são refeitos só nos grupos das entidades escolhidas, o que é barato
+        rows = np.concatenate([EMPTY] + [self.rows_by_entity.get((entity_type, entity), EMPTY)
+                                         for entity in entities])
+        own = self.rankings.loc[rows]
+        if not min_response_rate:
+            return own
+
+        groups = set(own[RANKING_KEYS].itertuples(index=False, name=None))
+        peers = self.rankings.loc[np.concatenate([EMPTY] + [self.rows_by_group[key] for key in groups])]
+        peers = _rank(peers[peers['responseRate'] > min_response_rate])
+
+        return peers.loc[peers.index.intersection(own.index)]
+
+
+def build_ranking_index(rankings):
+    return RankingIndex(
+        rankings=rankings,
+        rows_by_entity=row_indices(rankings, ['entityType', 'entity']),
+        rows_by_group=row_indices(rankings, RANKING_KEYS),
+    )
+
+
+def format_rankings(rankings):
+    # Tabela para as páginas, com nomes curtos e os valores arredondados
+    table = rankings.assign(
+        scope=rankings['scope'].astype(str).replace(SCOPE_LABELS),
+        metric=rankings['metric'].astype(str).replace(CATEGORY_LABELS),
+        value=rankings['value'].round(2),
+        percentile=rankings['percentile'].round(0),
+        responseRate=rankings['responseRate'].round(1),
+    )
+
+    return table.sort_values(['year', 'scope', 'metric'], ascending=[False, True, True])[
+        list(RANKING_LABELS)].rename(columns=RANKING_LABELS)
@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from utils.config import get_setting
+
+# Pasta com as versões dos dados já processados, prontos para as páginas
+SNAPSHOTS_DIR = Path(get_setting('SNAPSHOTS_DIR', 'data/store/snapshots'))
+
+# Versão do formato dos arquivos. Deve ser incrementada sempre que as colunas mudarem,
+# para que snapshots antigos sejam ignorados
+SNAPSHOT_FORMAT = 4
+
+# Quantidade de versões antigas mantidas em disco
+SNAPSHOT_KEEP = int(get_setting('SNAPSHOT_KEEP', 3))
+
+SNAPSHOT_FRAMES = ('teachers', 'responses_grouped', 'nps', 'comments_grouped',
+                   'category_means', 'survey_stats', 'trends', 'rankings')
+
+# Colunas de comentários, que são listas e não podem virar categorias
+COMMENT_COLUMNS = ('continue_doing_comments',
+                   'stop_doing_comments', 'start_doing_comments')
+
+
+def to_categorical(df, max_ratio=0.5):
+    # Converte as colunas de texto que se repetem bastante em categorias, que ocupam bem menos memória
+    df = df.copy()
+    for column in df.select_dtypes(include='object').columns:
+        if column in COMMENT_COLUMNS:
+            continue
+        if df[column].nunique() <= max_ratio * len(df):
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+def save_snapshot(frames):
+    # Escreve uma nova versão numa pasta própria e só depois aponta o CURRENT para ela
+    version = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    version_dir = SNAPSHOTS_DIR / version
+    version_dir.mkdir(parents=True)
+
+    for name in SNAPSHOT_FRAMES:
+        to_categorical(frames[name]).to_parquet(
+            version_dir / f'{name}.parquet', index=False)
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': {name: len(frames[name]) for name in SNAPSHOT_FRAMES},
+    }
+    (version_dir / 'manifest.json').write_text(json.dumps(manifest))
+
+    tmp_path = SNAPSHOTS_DIR / 'CURRENT.tmp'
+    tmp_path.write_text(version)
+    os.replace(tmp_path, SNAPSHOTS_DIR / 'CURRENT')
+
+    # Apaga as versões mais antigas
+    versions = sorted(path for path in SNAPSHOTS_DIR.iterdir() if path.is_dir())
+    for path in versions[:-SNAPSHOT_KEEP]:
+        shutil.rmtree(path, ignore_errors=True)
+
+    return manifest
+
+
+def _current_version_dir():
+    # Pasta da versão atual, se ela existir e for do formato atual
+    current_path = SNAPSHOTS_DIR / 'CURRENT'
+    if not current_path.exists():
+        return None, None
+
+    version_dir = SNAPSHOTS_DIR / current_path.read_text().strip()
+    manifest_path = version_dir / 'manifest.json'
+    if not manifest_path.exists():
+        return None, None
+
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        return None, None
+
+    return version_dir, manifest
+
+
+def load_snapshot():
+    # Lê a versão atual. Retorna None se não houver snapshot ou se ele for de um formato antigo
+    version_dir, manifest = _current_version_dir()
+    if version_dir is None:
+        return None
+
+    frames = {
+        name: pd.read_parquet(version_dir / f'{name}.parquet', memory_map=True)
+        for name in SNAPSHOT_FRAMES
+    }
+
+    # O parquet devolve as listas de comentários como arrays, então voltam a ser listas
+    for column in COMMENT_COLUMNS:
+        if column in frames['comments_grouped']:
+            frames['comments_grouped'][column] = frames['comments_grouped'][column].map(
+                list)
+
+    return frames, manifest
+
+
+def snapshot_age(manifest):
+    # Idade do snapshot em segundos
+    created_at = datetime.fromisoformat(manifest['created_at'])
+    return (datetime.now() - created_at).total_seconds()
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from tenacity import (retry, retry_if_exception_type, stop_after_attempt,
+                      wait_random_exponential)
+
+from utils.config import get_bool_setting, get_setting
+from utils.instrumentation import count_cache
+
+# Modelo usado nos resumos dos comentários
+SUMMARY_MODEL = get_setting('SUMMARY_MODEL', 'gpt-4o-mini')
+
+# Arquivo onde ficam os resumos já gerados, para não chamar a API de novo com os mesmos comentários
+SUMMARY_CACHE_PATH = Path(get_setting(
+    'SUMMARY_CACHE_PATH', 'data/store/summaries.sqlite'))
+
+# Quantidade máxima de resumos guardados e idade máxima (em segundos) de cada um
+SUMMARY_CACHE_MAX_ENTRIES = int(get_setting('SUMMARY_CACHE_MAX_ENTRIES', 1000))
+SUMMARY_CACHE_MAX_AGE = int(get_setting('SUMMARY_CACHE_MAX_AGE', 30 * 24 * 3600))
+
+# Tamanho máximo (em tokens estimados) do texto enviado numa única chamada e quantidade de chamadas ao mesmo tempo
+SUMMARY_MAX_INPUT_TOKENS = int(get_setting('SUMMARY_MAX_INPUT_TOKENS', 12000))
+SUMMARY_CONCURRENCY = int(get_setting('SUMMARY_CONCURRENCY', 4))
+
+# Mostra o resumo conforme ele é gerado, em vez de esperar a resposta inteira
+SUMMARY_STREAM = get_bool_setting('SUMMARY_STREAM', True)
+
+# Limite de chamadas por minuto à API e quantidade de tentativas quando ela falha ou está sobrecarregada
+SUMMARY_RATE_LIMIT = int(get_setting('SUMMARY_RATE_LIMIT', 60))
+SUMMARY_MAX_RETRIES = int(get_setting('SUMMARY_MAX_RETRIES', 5))
+
+# Instrução usada para juntar os resumos parciais quando os comentários não cabem numa única chamada
+REDUCE_PROMPT = ('Os textos a seguir são resumos parciais dos comentários dos alunos. '
+                 'Junte-os em um único resumo, seguindo estas instruções: ')
+
+# Texto que abre cada tipo de comentário
+COMMENT_HEADERS = {
+    'continue_doing_comments': 'Continue fazendo: ',
+    'stop_doing_comments': 'Pare de fazer: ',
+    'start_doing_comments': 'Comece a fazer: ',
+}
+
+# Um lock por chave em uso, para que dois usuários pedindo o mesmo resumo ao mesmo tempo gerem só uma chamada.
+# Cada chave guarda o lock e quantas chamadas estão com ele, e sai do dicionário quando a contagem volta a zero
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+class RateLimiter:
+    # Espaça as chamadas para não passar do limite por minuto, mesmo com várias threads chamando ao mesmo tempo
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+rate_limiter = RateLimiter(SUMMARY_RATE_LIMIT)
+
+
+@dataclass
+class LatencyStats:
+    # Tempo até o primeiro token e tempo total dos resumos mostrados nas páginas
+    requests: int = 0
+    cached: int = 0
+    total_first_token: float = 0.0
+    max_first_token: float = 0.0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, first_token, latency, cached=False):
+        with self.lock:
+            self.requests += 1
+            self.cached += cached
+            self.total_first_token += first_token
+            self.max_first_token = max(self.max_first_token, first_token)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+
+latency_stats = LatencyStats()
+
+
+def get_latency_status():
+    with latency_stats.lock:
+        requests = latency_stats.requests
+        return {
+            'requests': requests,
+            'cached': latency_stats.cached,
+            'avg_first_token_ms': 1000 * latency_stats.total_first_token / requests if requests else 0.0,
+            'max_first_token_ms': 1000 * latency_stats.max_first_token,
+            'avg_latency_ms': 1000 * latency_stats.total_latency / requests if requests else 0.0,
+            'max_latency_ms': 1000 * latency_stats.max_latency,
+        }
+
+
+def build_comments_text(comments):
+    # Junta todos os comentários no mesmo texto que é enviado para o modelo
+    return ''.join(header + ''.join(' '.join(row) for row in comments[column])
+                   for column, header in COMMENT_HEADERS.items())
+
+
+def estimate_tokens(text):
+    # Estimativa simples, de cerca de 4 caracteres por token, suficiente para decidir se o texto precisa ser dividido
+    return len(text) // 4 + 1
+
+
+def split_comments(comments, max_tokens=SUMMARY_MAX_INPUT_TOKENS):
+    # Divide os comentários em partes que cabem numa chamada, separando por tipo de comentário
+    chunks = []
+    for column, header in COMMENT_HEADERS.items():
+        chunk = header
+        for comment in (comment for row in comments[column] for comment in row):
+            if chunk != header and estimate_tokens(chunk + ' ' + comment) > max_tokens:
+                chunks.append(chunk)
+                chunk = header
+            chunk += (' ' if chunk != header else '') + comment
+        if chunk != header:
+            chunks.append(chunk)
+
+    return chunks
+
+
+def summary_key(prompt, model, text):
+    # O resumo só muda se o prompt, o modelo ou os comentários mudarem
+    payload = json.dumps([prompt, model, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def _key_lock(key):
+    # Só as chamadas da mesma chave esperam umas pelas outras. Resumos diferentes nunca dividem um lock
+    with _key_locks_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _key_locks[key]
+
+
+def _connect():
+    SUMMARY_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(SUMMARY_CACHE_PATH, timeout=30)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS summaries ('
+        'key TEXT PRIMARY KEY, model TEXT, summary TEXT, created_at REAL, last_used REAL)')
+    return connection
+
+
+def get_cached_summary(key):
+    with closing(_connect()) as connection, connection:
+        row = connection.execute(
+            'SELECT summary FROM summaries WHERE key = ? AND created_at >= ?',
+            (key, time.time() - SUMMARY_CACHE_MAX_AGE)).fetchone()
+        if row is None:
+            return None
+
+        connection.execute(
+            'UPDATE summaries SET last_used = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+
+def store_summary(key, model, summary):
+    now = time.time()
+    with closing(_connect()) as connection, connection:
+        connection.execute(
+            'INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)',
+            (key, model, summary, now, now))
+
+        # Remove os resumos vencidos e, se passar do limite, os usados há mais tempo
+        connection.execute(
+            'DELETE FROM summaries WHERE created_at < ?', (now - SUMMARY_CACHE_MAX_AGE,))
+        connection.execute(
+            'DELETE FROM summaries WHERE key NOT IN '
+            '(SELECT key FROM summaries ORDER BY last_used DESC LIMIT ?)',
+            (SUMMARY_CACHE_MAX_ENTRIES,))
+
+
+def clear_summaries():
+    with closing(_connect()) as connection, connection:
+        connection.execute('DELETE FROM summaries')
+
+
+# Tenta de novo, esperando cada vez mais, quando a API limita as chamadas ou fica indisponível
+_retry_api_errors = retry(retry=retry_if_exception_type((APIConnectionError, InternalServerError, RateLimitError)),
+                          wait=wait_random_exponential(multiplier=1, max=60),
+                          stop=stop_after_attempt(SUMMARY_MAX_RETRIES), reraise=True)
+
+
+@_retry_api_errors
+def _complete(client, prompt, text, model, stream=False):
+    rate_limiter.wait()
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "developer", "content": prompt},
+            {"role": "user", "content": text},
+        ],
+        stream=stream,
+    )
+    if stream:
+        return response
+    return response.choices[0].message.content
+
+
+def map_in_threads(func, items, workers=SUMMARY_CONCURRENCY):
+    # Aplica a função em paralelo mantendo a ordem dos itens, como o executor.map. As threads são daemon:
+    # o ThreadPoolExecutor é esperado na saída do interpretador, o que prenderia o processo num lote em andamento.
+    # Se algum item falhar, as threads param de pegar itens novos e o primeiro erro é levantado
+    results = [None] * len(items)
+    errors = []
+    jobs = queue.Queue()
+    for position, item in enumerate(items):
+        jobs.put((position, item))
+
+    def worker():
+        while not errors:
+            try:
+                position, item = jobs.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[position] = func(item)
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(workers, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+def _reduce_partials(client, prompt, chunks, model):
+    # Resume cada parte em paralelo e junta os resumos parciais, dividindo de novo se ainda forem grandes demais.
+    # Retorna o prompt e o texto da chamada final, que junta tudo num resumo só
+    partials = map_in_threads(lambda chunk: _complete(client, prompt, chunk, model), chunks)
+
+    reduce_prompt = REDUCE_PROMPT + prompt
+    while len(partials) > 1 and estimate_tokens('\n\n'.join(partials)) > SUMMARY_MAX_INPUT_TOKENS:
+        groups, group = [], []
+        for partial in partials:
+            if group and estimate_tokens('\n\n'.join(group + [partial])) > SUMMARY_MAX_INPUT_TOKENS:
+                groups.append(group)
+                group = []
+            group.append(partial)
+        groups.append(group)
+
+        # Se nenhum par de resumos couber junto, não há como reduzir mais: junta tudo numa chamada só
+        if len(groups) == len(partials):
+            break
+        partials = map_in_threads(
+            lambda group: _complete(client, reduce_prompt, '\n\n'.join(group), model), groups)
+
+    return reduce_prompt, '\n\n'.join(partials)
+
+
+def _final_request(client, prompt, comments, model):
+    # Envia os comentários numa única chamada se couberem, senão resume por partes antes da chamada final
+    text = build_comments_text(comments)
+    if estimate_tokens(text) <= SUMMARY_MAX_INPUT_TOKENS:
+        return prompt, text
+
+    return _reduce_partials(client, prompt, split_comments(comments), model)
+
+
+def generate_summary(client, prompt, comments, model=SUMMARY_MODEL):
+    return _complete(client, *_final_request(client, prompt, comments, model), model)
+
+
+def summarize_comments(client, prompt, comments, model=SUMMARY_MODEL):
+    # Faz um resumo dos comentários, reaproveitando o resumo salvo se os comentários não mudaram
+    started = time.perf_counter()
+    key = summary_key(prompt, model, build_comments_text(comments))
+
+    with _key_lock(key):
+        summary = get_cached_summary(key)
+        cached = summary is not None
+        if not cached:
+            summary = generate_summary(client, prompt, comments, model)
+            # Uma resposta vazia não é salva, senão seria mostrada como resumo até vencer
+            if summary:
+                store_summary(key, model, summary)
+
+    latency = time.perf_counter() - started
+    latency_stats.record(latency, latency, cached)
+    count_cache('summary', hit=cached)
+    return summary
+
+
+def stream_summary(client, prompt, comments, model=SUMMARY_MODEL):
+    # Igual ao summarize_comments, mas devolve o texto aos poucos, conforme o modelo gera
+    started = time.perf_counter()
+    key = summary_key(prompt, model, build_comments_text(comments))
+
+    # Só uma chamada gera e mostra o resumo aos poucos. As outras (outras sessões ou o lote em segundo plano)
+    # esperam no lock da chave e mostram o resumo que ela salvou
+    summary = get_cached_summary(key)
+    if summary is None:
+        with _key_lock(key):
+            summary = get_cached_summary(key)
+            if summary is None:
+                first_token = None
+                parts = []
+                for chunk in _complete(client, *_final_request(client, prompt, comments, model), model, stream=True):
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+                if parts:
+                    store_summary(key, model, ''.join(parts))
+
+                latency = time.perf_counter() - started
+                latency_stats.record(latency if first_token is None else first_token, latency)
+                count_cache('summary', hit=False)
+                return
+
+    latency = time.perf_counter() - started
+    latency_stats.record(latency, latency, cached=True)
+    count_cache('summary', hit=True)
+    yield summary
@@ -0,0 +1,80 @@
+import threading
+from datetime import datetime
+
+from openai import OpenAI
+
+from utils.config import get_setting
+from utils.summaries import (SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_MODEL,
+                             build_comments_text, get_cached_summary,
+                             map_in_threads, summarize_comments, summary_key)
+
+# Estado da última execução em segundo plano, mostrado no painel de administração
+batch_status = {'running': False}
+_batch_lock = threading.Lock()
+
+
+def summary_jobs(comments_grouped, teacher_prompt, class_prompt):
+    # Os mesmos conjuntos de comentários que as páginas resumem: todos os de cada professor e todos os de cada turma.
+    # A ordem das linhas é mantida para que o texto, e portanto a chave do resumo salvo, seja o mesmo das páginas
+    jobs = []
+    for column, prompt in [('eval_username', teacher_prompt), ('turma', class_prompt)]:
+        if not prompt:
+            continue
+        for name, comments in comments_grouped.groupby(column, observed=True, sort=False):
+            jobs.append((column, name, prompt, comments))
+
+    return jobs
+
+
+def precompute_summaries(client, comments_grouped, model=SUMMARY_MODEL):
+    # Gera os resumos que ainda não estão salvos. Os que já existem (comentários sem mudança) são pulados
+    jobs = summary_jobs(comments_grouped, get_setting(
+        'TEACHER_PROMPT'), get_setting('CLASS_PROMPT'))
+
+    # O armazenamento guarda no máximo SUMMARY_CACHE_MAX_ENTRIES resumos e remove os usados há mais tempo.
+    # Passando disso, o próprio lote removeria parte do que gerou e a próxima atualização pagaria para gerar de novo
+    skipped = max(0, len(jobs) - SUMMARY_CACHE_MAX_ENTRIES)
+    jobs = jobs[:SUMMARY_CACHE_MAX_ENTRIES]
+    pending = [job for job in jobs if get_cached_summary(
+        summary_key(job[2], model, build_comments_text(job[3]))) is None]
+
+    def run(job):
+        column, name, prompt, comments = job
+        try:
+            summarize_comments(client, prompt, comments, model)
+            return None
+        except Exception as error:
+            return f"{column} {name}: {error}"
+
+    # As threads são daemon para que um lote em andamento não impeça o processo de terminar
+    errors = [error for error in map_in_threads(run, pending) if error]
+
+    return {
+        'total': len(jobs),
+        'cached': len(jobs) - len(pending),
+        'generated': len(pending) - len(errors),
+        'failed': len(errors),
+        'skipped': skipped,
+        'errors': errors[:10],
+    }
+
+
+def start_summary_batch(comments_grouped):
+    # Gera os resumos numa thread em segundo plano, sem travar a página. Só roda uma vez por vez
+    api_key = get_setting('OPENAI_API_KEY')
+    if not api_key or not _batch_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        batch_status.update(
+            running=True, started_at=datetime.now().isoformat(timespec='seconds'))
+        try:
+            batch_status.update(precompute_summaries(
+                OpenAI(api_key=api_key), comments_grouped))
+        finally:
+            batch_status.update(
+                running=False, finished_at=datetime.now().isoformat(timespec='seconds'))
+            _batch_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from utils.aggregates import CATEGORY_LABELS
+from utils.config import get_setting
+
+# Níveis da série histórica e a coluna das médias por categoria que identifica cada entidade
+TREND_LEVELS = {'teacher': 'fullName', 'turma': 'turma', 'course': 'courseName'}
+
+# Quantidade de períodos com avaliação usados na média móvel. Opcional, o padrão é 3
+TREND_WINDOW = int(get_setting('TREND_WINDOW', 3))
+
+PERIOD_KEYS = ['year', 'period']
+SERIES_KEYS = ['level', 'entity', 'questionSubCategory']
+SUM_COLUMNS = ['responseValue_sum', 'responseValue_count']
+
+
+def _base(category_means):
+    # Soma e contagem das notas de cada entidade, categoria e período, a partir das médias já agregadas
+    frames = []
+    for level, column in TREND_LEVELS.items():
+        base = category_means.groupby([column, 'questionSubCategory'] + PERIOD_KEYS, observed=True)[
+            SUM_COLUMNS].sum().reset_index()
+        frames.append(base.rename(columns={column: 'entity'}).assign(level=level))
+
+    base = pd.concat(frames, ignore_index=True)[SERIES_KEYS + PERIOD_KEYS + SUM_COLUMNS]
+    return base.astype({'entity': str, 'questionSubCategory': str, 'period': str, 'year': int})
+
+
+def _add_series(base):
+    # Ordena cada série por período e calcula a média, a média móvel e a variação em relação ao período anterior.
+    # A média móvel soma as notas e as contagens dos últimos TREND_WINDOW períodos, então continua exata
+    trends = base.sort_values(SERIES_KEYS + PERIOD_KEYS, ignore_index=True)
+    series = trends.groupby(SERIES_KEYS, sort=False).ngroup()
+
+    cumulative = trends[SUM_COLUMNS].groupby(series).cumsum()
+    window = cumulative - cumulative.groupby(series).shift(TREND_WINDOW, fill_value=0)
+
+    trends['responseValue'] = trends['responseValue_sum'] / trends['responseValue_count']
+    trends['rollingMean'] = window['responseValue_sum'] / window['responseValue_count']
+    trends['delta'] = trends['responseValue'] - trends['responseValue'].groupby(series).shift()
+    trends['yearAndPeriod'] = trends['year'].astype(str) + '.' + trends['period']
+
+    return trends
+
+
+def compute_trends(category_means):
+    return _add_series(_base(category_means))
+
+
+def build_trend_index(trends):
+    # Linhas de cada entidade, para que os gráficos das páginas sejam uma consulta num dicionário
+    return {key: np.asarray(trends.index[positions])
+            for key, positions in trends.groupby(['level', 'entity'], observed=True, sort=False).indices.items()}
+
+
+def select_trends(trends, rows, years=None):
+    # Série de uma entidade nos anos escolhidos, sem a Avaliação Geral, que usa a escala do NPS
+    selected = trends.loc[rows]
+    selected = selected[selected['questionSubCategory'] != 'Avaliação Geral']
+    if years:
+        selected = selected[selected['year'].isin(years)]
+
+    return selected.assign(questionSubCategory=selected['questionSubCategory'].astype(str).replace(CATEGORY_LABELS))